@@ -0,0 +1,129 @@
+"""
+Benchmark and regression runner: verifies every program in benchmarks/ and tests/ over a sweep of unroll
+depths in one process, and records wall time, solver time, paths and solver queries per run.
+Verdicts are checked against the file names: *_valid programs must have no violation at any depth, and
+*_invalid programs must have one at some depth. A program without either suffix is expected to be valid
+when a sibling <name>_invalid.imp exists, and is unchecked otherwise.
+Results can be saved as a baseline and later runs compared against it: a changed verdict, or a run slower
+than threshold times its baseline (and by at least min_time seconds), is a regression.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+from see import verify, add_engine_arguments, check_engine_arguments, engine_options, non_negative_int
+
+DEFAULT_FILES = ["benchmarks/*.imp", "tests/*.imp"]
+
+def expected_verdict(path):
+	stem = os.path.splitext(os.path.basename(path))[0].lower()
+	if stem.endswith("_invalid"):
+		return "invalid"
+	if stem.endswith("_valid"):
+		return "valid"
+	sibling = os.path.join(os.path.dirname(path), os.path.splitext(os.path.basename(path))[0] + "_invalid.imp")
+	if os.path.exists(sibling):
+		return "valid"
+	return None
+
+
+def run_benchmarks(paths, unrolls, options, repeat=1, root=None):
+	"""
+	Verify each file at each depth and return {file: {"expected": ..., "verdict": ..., "runs": {depth: record}}}.
+	Timings are the best of repeat runs. With root, files are named by their path relative to root, so
+	results taken from different working directories compare.
+	"""
+	results = {}
+	for path in paths:
+		name = os.path.relpath(path, root) if root else path
+		with open(path) as myFile:
+			program = myFile.read()
+		runs = {}
+		for num_unrolls in unrolls:
+			best = None
+			for _ in range(repeat):
+				start = time.perf_counter()
+				result = verify(program, num_unrolls, **options)
+				wall_time = time.perf_counter() - start
+				if best is None or wall_time < best["wall_time"]:
+					best = {"wall_time": wall_time, "solve_time": result["stats"]["solve_time"],
+						"paths": result["stats"]["paths"], "queries": result["stats"]["queries"],
+						"violations": len(result["violations"])}
+			runs[str(num_unrolls)] = best
+			print(f"{name:40} {num_unrolls:3} {best['wall_time']:8.3f}s {best['solve_time']:8.3f}s "
+				f"{best['paths']:7} paths {best['queries']:7} queries {best['violations']:4} violations",
+				file=sys.stderr, flush=True)
+
+		verdict = "invalid" if any(run["violations"] for run in runs.values()) else "valid"
+		results[name] = {"expected": expected_verdict(path), "verdict": verdict, "runs": runs}
+	return results
+
+
+def compare(results, baseline, threshold, min_time):
+	"""
+	Return the list of problems: unexpected verdicts not already recorded in the baseline, verdicts that
+	changed from the baseline, and runs slower than the baseline by more than threshold (and min_time).
+	"""
+	problems = []
+	for path, result in results.items():
+		base = baseline.get(path)
+		if result["expected"] and result["verdict"] != result["expected"] and \
+				(base is None or base["verdict"] != result["verdict"]):
+			problems.append(f"{path}: expected {result['expected']}, found {result['verdict']}")
+
+		if base is None:
+			continue
+		if base["verdict"] != result["verdict"]:
+			problems.append(f"{path}: verdict changed from {base['verdict']} to {result['verdict']}")
+		for depth, run in result["runs"].items():
+			base_run = base["runs"].get(depth)
+			if base_run and run["wall_time"] > base_run["wall_time"] * threshold and \
+					run["wall_time"] - base_run["wall_time"] > min_time:
+				problems.append(f"{path} @ {depth}: {run['wall_time']:.3f}s vs baseline {base_run['wall_time']:.3f}s "
+					f"({run['wall_time'] / base_run['wall_time']:.2f}x)")
+	return problems
+
+
+def main(argv=None):
+	arg_parser = argparse.ArgumentParser(prog="benchmark.py", description="Time and check the .imp programs.")
+	arg_parser.add_argument("input_files", nargs="*", help=f"programs to run (default: {' '.join(DEFAULT_FILES)})")
+	arg_parser.add_argument("--unrolls", type=non_negative_int, nargs="+", default=[0, 1, 2, 3], metavar="N")
+	arg_parser.add_argument("--repeat", type=int, default=1, help="runs per program and depth; the fastest is kept")
+	arg_parser.add_argument("--output", help="file to write the results to as JSON")
+	arg_parser.add_argument("--save-baseline", metavar="PATH", help="write the results as the new baseline")
+	arg_parser.add_argument("--baseline", metavar="PATH", help="compare against a saved baseline")
+	arg_parser.add_argument("--threshold", type=float, default=1.5, help="slowdown ratio reported as a regression")
+	arg_parser.add_argument("--min-time", type=float, default=0.05,
+		help="ignore slowdowns smaller than this many seconds (timer noise)")
+	add_engine_arguments(arg_parser)
+	args = arg_parser.parse_args(argv)
+	check_engine_arguments(arg_parser, args)
+
+	script_dir = os.path.dirname(os.path.abspath(__file__))
+	paths = args.input_files or sorted(p for pattern in DEFAULT_FILES for p in glob.glob(os.path.join(script_dir, pattern)))
+	results = run_benchmarks(paths, args.unrolls, engine_options(args), args.repeat, script_dir)
+
+	report = {"unrolls": args.unrolls, "options": engine_options(args), "results": results}
+	for path in (args.output, args.save_baseline):
+		if path:
+			with open(path, "w") as out:
+				json.dump(report, out, indent=1, sort_keys=True)
+
+	baseline = {}
+	if args.baseline:
+		with open(args.baseline) as myFile:
+			baseline = json.load(myFile)["results"]
+
+	problems = compare(results, baseline, args.threshold, args.min_time)
+	total = sum(run["wall_time"] for result in results.values() for run in result["runs"].values())
+	print(f"{len(results)} programs, total {total:.3f}s, {len(problems)} problems")
+	for problem in problems:
+		print(problem)
+	return 1 if problems else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
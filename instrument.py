@@ -0,0 +1,120 @@
+"""
+Optional instrumentation of one verification run. An Engine built with profile=True hands a Profile to
+its solver and checks `profile is not None` at each hook, so a run without it pays one attribute test per
+hook and nothing else.
+Statements are identified by their preorder index in the parsed body, which is the same in every process,
+so the profiles of parallel workers can be merged.
+"""
+
+import heapq
+import os
+import sys
+from itertools import count
+
+from program_parser import format_stmt
+
+PHASES = ("parse", "translate", "solve")
+COUNTERS = ("paths", "branches", "pushes", "pops", "queries", "terms")
+
+def statement_index(body):
+	"""
+	Map id(stmt) to (preorder index, stmt) for every statement in body, nested blocks included.
+	"""
+	index = {}
+	def walk(block):
+		for stmt in block:
+			index[id(stmt)] = (len(index), stmt)
+			if stmt[0] in ('if', 'while'):
+				walk(stmt[2])
+			elif stmt[0] == 'ifelse':
+				walk(stmt[2])
+				walk(stmt[3])
+	walk(body)
+	return index
+
+
+class Profile:
+	"""
+	Phase timers (seconds), counters, per-statement hits, per-loop entries and iterations, and the slowest
+	solver queries as SMT-LIB text. With smt_dir, each kept query is also written to a file there.
+	With trace (a writable file), one line is written per branch, assertion and finished path.
+	"""
+
+	def __init__(self, slowest=0, smt_dir=None, trace=None):
+		self.timers = dict.fromkeys(PHASES, 0.0)
+		self.counters = dict.fromkeys(COUNTERS, 0)
+		self.statements = {}
+		self.loops = {}
+		self.slowest = slowest
+		self.smt_dir = smt_dir
+		self.trace = trace
+		self.slow_queries = []
+		self._seq = count()
+
+	def record_query(self, elapsed, smt2):
+		"""
+		Keep a query among the slowest ones. smt2 is a function returning its SMT-LIB text, only called
+		for queries that are kept.
+		"""
+		if self.slowest <= 0:
+			return
+		if len(self.slow_queries) >= self.slowest and elapsed <= self.slow_queries[0][0]:
+			return
+		entry = (elapsed, next(self._seq), smt2())
+		if len(self.slow_queries) < self.slowest:
+			heapq.heappush(self.slow_queries, entry)
+		else:
+			heapq.heapreplace(self.slow_queries, entry)
+
+	def event(self, trace, *fields):
+		print(" ".join(str(f) for f in ("".join(map(str, trace)) or "-",) + fields), file=self.trace)
+
+	def merge(self, other):
+		"""
+		Add the report dict of another Profile (e.g. from a worker process) into this one.
+		"""
+		for k, v in other["timers"].items():
+			self.timers[k] += v
+		for k, v in other["counters"].items():
+			self.counters[k] += v
+		for s in other["statements"]:
+			self.statements[s["index"]] = self.statements.get(s["index"], 0) + s["hits"]
+		for s in other["loops"]:
+			entries, iterations = self.loops.get(s["index"], (0, 0))
+			self.loops[s["index"]] = (entries + s["entries"], iterations + s["iterations"])
+		for q in other["slow_queries"]:
+			self.record_query(q["time"], lambda q=q: q["smt2"])
+
+	def report(self, index=None):
+		"""
+		The profile as a dict of plain values. index (from statement_index) labels statements with their source.
+		"""
+		labels = {i: format_stmt(stmt) for i, stmt in index.values()} if index else {}
+		slow = sorted(self.slow_queries, reverse=True)
+		if self.smt_dir:
+			os.makedirs(self.smt_dir, exist_ok=True)
+			for rank, (_, _, smt2) in enumerate(slow):
+				with open(os.path.join(self.smt_dir, f"query{rank}.smt2"), "w") as out:
+					out.write(smt2)
+		return {"timers": dict(self.timers), "counters": dict(self.counters),
+			"statements": [{"index": i, "stmt": labels.get(i), "hits": hits} for i, hits in sorted(self.statements.items())],
+			"loops": [{"index": i, "stmt": labels.get(i), "entries": entries, "iterations": iterations}
+				for i, (entries, iterations) in sorted(self.loops.items())],
+			"slow_queries": [{"time": elapsed, "smt2": smt2} for elapsed, _, smt2 in slow]}
+
+
+def print_report(report, out=sys.stderr):
+	"""
+	Print a profile report in readable form.
+	"""
+	print("phase times: " + ", ".join(f"{k} {v:.3f}s" for k, v in report["timers"].items()), file=out)
+	print("counters: " + ", ".join(f"{k} {v}" for k, v in report["counters"].items()), file=out)
+	print("statement hits:", file=out)
+	for s in report["statements"]:
+		print(f"{s['hits']:9} {s['stmt']}", file=out)
+	if report["loops"]:
+		print("loops (entries, iterations):", file=out)
+		for s in report["loops"]:
+			print(f"{s['entries']:9} {s['iterations']:9} {s['stmt']}", file=out)
+	if report["slow_queries"]:
+		print("slowest queries: " + ", ".join(f"{q['time']:.4f}s" for q in report["slow_queries"]), file=out)
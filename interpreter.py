@@ -0,0 +1,272 @@
+"""
+Concrete interpreter for parsed programs, used to look for violations on random inputs before symbolic
+execution and to replay the symbolic engine's counterexamples.
+Loops are bounded like in the symbolic engine: a run that would start iteration num_unrolls + 1 of a loop
+entry is abandoned, so both sides explore the same paths.
+Values the interpreter cannot decide raise Unknown: a division by 0 (uninterpreted in z3), a variable or
+array element read before it is assigned, and quantifiers whose bound variables are not confined to a
+finite range of at most max_range values each by the comparisons in their antecedent (forall) or body
+(exists) and that have no witness near their bounds. An undecided precondition rejects the input, an
+undecided assertion is skipped and an undecided guard abandons the run, so every violation reported is
+genuine.
+"""
+
+import random
+import time
+from itertools import product
+
+from symbolic import smt_div, smt_mod
+from z3 import IntVal, K, IntSort, Select, Store, simplify
+
+class Unknown(Exception):
+	pass
+
+
+class Abandoned(Exception):
+	pass
+
+
+class ConcreteArray:
+	"""
+	A total Int -> Int function: the values read so far, and a source giving the value of any other index.
+	"""
+
+	def __init__(self, source, values=None):
+		self.source = source
+		self.values = dict(values or {})
+
+	def __getitem__(self, index):
+		if index not in self.values:
+			self.values[index] = self.source(index)
+		return self.values[index]
+
+	def store(self, index, value):
+		array = ConcreteArray(self.source, self.values)
+		array.values[index] = value
+		return array
+
+	def __str__(self):
+		"""
+		The array in z3's notation, with every index not read set to 0.
+		"""
+		value = K(IntSort(), IntVal(0))
+		for index, v in sorted(self.values.items()):
+			value = Store(value, index, v)
+		return str(value)
+
+
+_ARITH = {'+': lambda a, b: a + b, '-': lambda a, b: a - b, '*': lambda a, b: a * b, '/': smt_div, '%': smt_mod}
+_COMPARE = {'<': lambda a, b: a < b, '>': lambda a, b: a > b, '<=': lambda a, b: a <= b, '>=': lambda a, b: a >= b,
+	'=': lambda a, b: a == b, '!=': lambda a, b: a != b}
+WITNESS_RANGE = 16
+_FLIP = {'<': '>', '>': '<', '<=': '>=', '>=': '<=', '=': '='}
+
+
+class Interpreter:
+	"""
+	Runs a parsed program (var_list, preconditions, body as returned by see.load_program) on concrete inputs.
+	"""
+
+	def __init__(self, var_list, preconditions, body, num_unrolls, max_range=1000):
+		self.var_list = var_list
+		self.preconditions = preconditions
+		self.body = body
+		self.num_unrolls = num_unrolls
+		self.max_range = max_range
+
+	def eval(self, exp, env):
+		op = exp[0]
+		if op == 'INT':
+			return exp[1]
+		if op in ('VAR', 'ARR'):
+			if exp[1] not in env:
+				raise Unknown(f"{exp[1]} read before it is assigned")
+			return env[exp[1]] if len(exp) == 2 else env[exp[1]][self.eval(exp[2], env)]
+		if op in ('forall', 'exists'):
+			return self.eval_quantifier(exp, env)
+		if op == '!':
+			return not self.eval(exp[1], env)
+		if op == '&&':
+			return self.eval(exp[1], env) and self.eval(exp[2], env)
+		if op == '||':
+			return self.eval(exp[1], env) or self.eval(exp[2], env)
+		if op == '==>':
+			return not self.eval(exp[1], env) or self.eval(exp[2], env)
+
+		lhs, rhs = self.eval(exp[1], env), self.eval(exp[2], env)
+		if op in _COMPARE:
+			return _COMPARE[op](lhs, rhs)
+		if op in ('/', '%') and rhs == 0:
+			raise Unknown("division by 0")
+		return _ARITH[op](lhs, rhs)
+
+	def eval_quantifier(self, exp, env):
+		"""
+		Evaluate forall/exists by enumerating the ranges their bound variables are confined to.
+		"""
+		names, body = exp[1], exp[2]
+		conjuncts = []
+		_conjuncts(body[1] if exp[0] == 'forall' and body[0] == '==>' else body if exp[0] == 'exists' else [], conjuncts)
+
+		low, high = dict.fromkeys(names), dict.fromkeys(names)
+		for _ in range(len(names) + 1):
+			for c in conjuncts:
+				for op, var, other in ((c[0], c[1], c[2]), (_FLIP.get(c[0]), c[2], c[1])):
+					if op is None or var[0] != 'VAR' or var[1] not in low:
+						continue
+					if other[0] == 'VAR' and other[1] in low:
+						lo, hi = low[other[1]], high[other[1]]
+					elif _mentions(other, names):
+						continue
+					else:
+						lo = hi = self.eval(other, env)
+					if op in ('>', '>=', '=') and lo is not None:
+						lo += op == '>'
+						low[var[1]] = lo if low[var[1]] is None else max(low[var[1]], lo)
+					if op in ('<', '<=', '=') and hi is not None:
+						hi -= op == '<'
+						high[var[1]] = hi if high[var[1]] is None else min(high[var[1]], hi)
+
+		# without finite bounds only a witness (a counterexample to forall, an example of exists) is conclusive,
+		# so it is looked for among the values nearest the known bound or 0
+		bounded = all(low[name] is not None and high[name] is not None and high[name] - low[name] < self.max_range
+			for name in names)
+		ranges = []
+		for name in names:
+			lo, hi = low[name], high[name]
+			if not bounded:
+				if lo is None:
+					lo = hi - 2 * WITNESS_RANGE if hi is not None else -WITNESS_RANGE
+				hi = lo + 2 * WITNESS_RANGE if hi is None else min(hi, lo + 2 * WITNESS_RANGE)
+			ranges.append(range(lo, hi + 1))
+
+		inner = dict(env)
+		for values in product(*ranges):
+			inner.update(zip(names, values))
+			if self.eval(body, inner) == (exp[0] == 'exists'):
+				return exp[0] == 'exists'
+		if not bounded:
+			raise Unknown(f"unbounded quantifier over {', '.join(names)}")
+		return exp[0] == 'forall'
+
+	def run(self, inputs):
+		"""
+		Run the body on inputs (a dict from the names in var_list to ints and ConcreteArrays).
+		Returns the list of assert statements that failed, or None if the preconditions do not hold or
+		cannot be decided.
+		"""
+		env = dict(inputs)
+		try:
+			if not all(self.eval(pre, env) for pre in self.preconditions):
+				return None
+		except Unknown:
+			return None
+
+		failed = []
+		try:
+			self.exec_block(self.body, env, failed)
+		except (Abandoned, Unknown):
+			pass
+		return failed
+
+	def exec_block(self, block, env, failed):
+		for stmt in block:
+			if stmt[0] == 'assert':
+				try:
+					if not self.eval(stmt[1], env):
+						failed.append(stmt)
+				except Unknown:
+					pass
+			elif stmt[0] == 'store':
+				array = env.get(stmt[1]) or ConcreteArray(_unassigned)
+				env[stmt[1]] = array.store(self.eval(stmt[2], env), self.eval(stmt[3], env))
+			elif stmt[0] == 'assign':
+				values = [self.eval(exp, env) for exp in stmt[2]]
+				env.update(zip(stmt[1], values))
+			elif stmt[0] == 'if':
+				if self.eval(stmt[1], env):
+					self.exec_block(stmt[2], env, failed)
+			elif stmt[0] == 'ifelse':
+				self.exec_block(stmt[2] if self.eval(stmt[1], env) else stmt[3], env, failed)
+			else:
+				iterations = 0
+				while self.eval(stmt[1], env):
+					if iterations == self.num_unrolls:
+						raise Abandoned()
+					self.exec_block(stmt[2], env, failed)
+					iterations += 1
+
+	def random_inputs(self, rng):
+		"""
+		Random inputs biased towards boundary values: ints mostly in [-2, 10], arrays with values from the same range.
+		"""
+		def value():
+			roll = rng.random()
+			if roll < 0.3:
+				return rng.choice((0, 1, -1, 2))
+			if roll < 0.9:
+				return rng.randint(-2, 10)
+			return rng.randint(-100, 100)
+
+		return {name: ConcreteArray(lambda index: value()) if name.startswith("ARR_") else value()
+			for name in self.var_list}
+
+	def search(self, trials=1000, seed=None, time_limit=None):
+		"""
+		Run up to trials random inputs (within time_limit seconds) and return, for each assert statement
+		that failed, the first inputs it failed on, as a list of (stmt, inputs) in the order found.
+		"""
+		rng = random.Random(seed)
+		deadline = time.perf_counter() + time_limit if time_limit is not None else None
+		found = {}
+		for _ in range(trials):
+			if deadline is not None and time.perf_counter() > deadline:
+				break
+			inputs = self.random_inputs(rng)
+			for stmt in self.run(inputs) or ():
+				found.setdefault(id(stmt), (stmt, inputs))
+		return list(found.values())
+
+
+def _unassigned(index):
+	raise Unknown(f"array element {index} read before it is assigned")
+
+
+def format_inputs(name, var_list, inputs):
+	"""
+	A violation in check_assertion's "name v1 v2 ..." format.
+	"""
+	return " ".join([name] + [str(inputs[var]) for var in var_list])
+
+
+def inputs_from_model(model, var_list):
+	"""
+	The concrete inputs of a z3 model (or MergedModel); variables the model leaves free are 0.
+	"""
+	values = {d.name(): model[d] for d in model.decls()}
+	inputs = {}
+	for var in var_list:
+		value = values.get(var)
+		if var.startswith("ARR_"):
+			source = (lambda index, value=value: simplify(Select(value, IntVal(index))).as_long()) \
+				if value is not None else (lambda index: 0)
+			inputs[var] = ConcreteArray(source)
+		else:
+			inputs[var] = value.as_long() if value is not None else 0
+	return inputs
+
+
+def _conjuncts(exp, out):
+	if exp and exp[0] == '&&':
+		_conjuncts(exp[1], out)
+		_conjuncts(exp[2], out)
+	elif exp and exp[0] in _FLIP:
+		out.append(exp)
+
+
+def _mentions(exp, names):
+	if exp[0] == 'VAR':
+		return exp[1] in names
+	if exp[0] in ('forall', 'exists'):
+		return _mentions(exp[2], [n for n in names if n not in exp[1]])
+	return any(_mentions(e, names) for e in exp[1:] if isinstance(e, list))
@@ -1,4 +1,4 @@
-import string
+import functools
 import re
 
 
@@ -21,138 +21,183 @@ def prune_whitespace(s, max_consec=0):
     s = re.sub("\s+", ''.join([' '] * max_consec), s)  
     return s
 
-assert(prune_whitespace("     \ta      b   c     d\n  e  ")) == "abcde"
-assert(prune_whitespace("     \ta      b   c     d\n  e  ", 1)) == " a b c d e "
-assert(prune_whitespace("     \ta      b   c     d\n  e  ", 2)) == "  a  b  c  d  e  "
-assert(prune_whitespace("some\n \twords", 1)) == "some words"
 
+_TOKENS = re.compile(r"\s*(?:(\d+)|([A-Za-z_]\w*)|(==>|==|&&|\|\||!=|<=|>=|[-+*/%()\[\]<>=!,]))")
+_BINARY = {"==>": 1, "||": 2, "&&": 3, "=": 4, "!=": 4, "<": 4, "<=": 4, ">": 4, ">=": 4,
+    "+": 5, "-": 5, "*": 6, "/": 6, "%": 6}
+_BOOL_OPS = {"==>", "||", "&&", "!", "forall", "exists", "=", "!=", "<", "<=", ">", ">="}
+_COMPARISON, _PRODUCT = 4, 6
 
 
-def back_scan_for_phrases_outside_parens(scan_str, phrase_list):
-    phrase_list = sorted(phrase_list, key=len)[::-1]  # Get longest first to prevent things like recognizing "<" in "<="
-    phrase_max_length = len(phrase_list[0])
-    scan_len = len(scan_str)
-    par_ct = 0
-    for i in range (scan_len-1, -1, -1):
-        if scan_str[i] in ")]}":
-            par_ct += 1
-        elif scan_str[i] in "([{":
-            par_ct -= 1
-            if par_ct < 0:
+def tokenize(in_str):
+    """
+    Split an expression into ("INT", value), ("NAME", name) and ("OP", operator) tokens in one pass.
+    `==` is not an operator of the language: like the original scanner, its first "=" is read as part
+    of the preceding name (so "f == 0" compares the variable "f=").
+    """
+    tokens, pos, end = [], 0, len(in_str.rstrip())
+    while pos < end:
+        m = _TOKENS.match(in_str, pos)
+        if m is None:
+            raise NotImplementedError
+        number, name, op = m.groups()
+        if number is not None:
+            tokens.append(("INT", int(number)))
+        elif name is not None:
+            tokens.append(("NAME", name))
+        elif op == "==":
+            if not tokens or tokens[-1][0] != "NAME":
                 raise NotImplementedError
-        elif par_ct == 0:
-            possible_phrase = scan_str[max(i-phrase_max_length+1, 0):i+1]  # Shortest string guaranteed to contain all phrases starting at that point.
-            # We go left in order to not match proper suffixes (have to go same direction as scan)
-            for p in phrase_list:
-                if possible_phrase.endswith(p):
-                    return (i+1-len(p), i+1)
-
-    return None
-
-
-assert back_scan_for_phrases_outside_parens("%0000", ["%"]) == (0, 1)
-assert back_scan_for_phrases_outside_parens("0000%", ["%"]) == (4, 5)
-assert back_scan_for_phrases_outside_parens("000%%00", ["%"]) == (4, 5)
-assert back_scan_for_phrases_outside_parens("000", ["%"]) is None
-assert back_scan_for_phrases_outside_parens("0(%)((%)%)00", ["%"]) is None
-assert back_scan_for_phrases_outside_parens("0(%)%(%)0", ["%"]) == (4, 5)
-assert back_scan_for_phrases_outside_parens("00<=0", ["%"]) is None
-assert back_scan_for_phrases_outside_parens("00<=0", ["<", "<="]) == (2, 4)
-assert back_scan_for_phrases_outside_parens("00<=0", ["=", "<="]) == (2, 4)
+            tokens[-1] = ("NAME", tokens[-1][1] + "=")
+            tokens.append(("OP", "="))
+        else:
+            tokens.append(("OP", op))
+        pos = m.end()
+    return tokens
 
-def parse_aexp(in_str, assignments=None, should_sub=False):
-    in_str = prune_whitespace(in_str)
-    
-    if in_str == "":
-        raise NotImplementedError
 
-    for char_list in [["+", "-"], ["*", "/", "%"]]:  # Do lowest-to-highest precedence scan
-        break_idxs = back_scan_for_phrases_outside_parens(in_str, char_list)
-        if break_idxs is not None:
-            aexp1, op, aexp2 = in_str[:break_idxs[0]], in_str[break_idxs[0]:break_idxs[1]], in_str[break_idxs[1]:]
-            if aexp2 == '':
-                raise NotImplementedError
-            if aexp1 == '':
-                if op == '-':  # Support negation
-                    aexp1 = '0'
-                else:
-                    raise NotImplementedError
-            return [op, parse_aexp(aexp1, assignments, should_sub), parse_aexp(aexp2, assignments, should_sub)]
-    if in_str[0] == "(" and in_str[-1] == ")":
-        return parse_aexp(in_str[1:-1], assignments, should_sub)
-    if in_str[0] in '0123456789':
-        return(["INT", int(in_str)])
-    fb, lb = in_str.find('['), in_str.rfind(']')
-    if fb != -1 and lb != -1:  # Given brackets for a list index, process it as that
-        return ["ARR", "ARR_"+in_str[:fb], parse_aexp(in_str[fb+1:lb], assignments, should_sub)]
-    for c in ["()+-*/%<>=![]"]:
-        assert c not in in_str
-
-    if should_sub and in_str in assignments:
-        return assignments[in_str]
-
-    return(["VAR", in_str])
-
-assert parse_aexp("x+2*3%4") == ['+', ['VAR', 'x'], ['%', ['*', ['INT', 2], ['INT', 3]], ['INT', 4]]]
-assert parse_aexp("(5+6)*(4+2)%((7+8)/(5+6))") == ['%', ['*', ['+', ['INT', 5], ['INT', 6]], ['+', ['INT', 4], ['INT', 2]]], ['/', ['+', ['INT', 7], ['INT', 8]], ['+', ['INT', 5], ['INT', 6]]]]
-assert parse_aexp("arr[x+2*3%4]") == ["ARR", "ARR_arr", parse_aexp("x+2*3%4")]
-
-
-def parse_comp(in_str, assignments=None, should_sub=False):    
-    in_str = prune_whitespace(in_str)
-    break_idxs = back_scan_for_phrases_outside_parens(in_str, ["=", "!=", "<=", ">=", "<", ">"])
-    if break_idxs is None:
+class _Parser:
+    """
+    Precedence climbing over the tokens of one expression. Binary operators are left associative, from
+    loosest to tightest: ==>, ||, &&, comparisons, + -, * / %. A quantifier's body and a leading "-" extend
+    as far right as they can at their level (everything, and a product), "!" applies to a comparison, and
+    operands are checked to be boolean or arithmetic as their operator requires.
+    """
+
+    def __init__(self, in_str):
+        self.tokens = tokenize(in_str)
+        self.pos = 0
+
+    def peek(self, offset=0):
+        idx = self.pos + offset
+        return self.tokens[idx] if idx < len(self.tokens) else (None, None)
+
+    def expect(self, op):
+        if self.peek() != ("OP", op):
+            raise NotImplementedError
+        self.pos += 1
+
+    def parse(self):
+        exp = self.binary(1)
+        if self.pos != len(self.tokens):
+            raise NotImplementedError
+        return exp
+
+    def binary(self, min_prec):
+        left = self.unary()
+        while True:
+            kind, op = self.peek()
+            prec = _BINARY.get(op) if kind == "OP" else None
+            if prec is None or prec < min_prec:
+                return left
+            self.pos += 1
+            right = self.binary(prec + 1)
+            _check_operands(prec < _COMPARISON, left, right)
+            left = [op, left, right]
+
+    def unary(self):
+        kind, value = self.peek()
+        if kind == "OP" and value == "!":
+            self.pos += 1
+            operand = self.binary(_COMPARISON)
+            _check_operands(True, operand)
+            return ["!", operand]
+        if kind == "OP" and value == "-":
+            self.pos += 1
+            operand = self.binary(_PRODUCT)
+            _check_operands(False, operand)
+            return ["-", ["INT", 0], operand]
+        if kind == "NAME" and value in ("forall", "exists") and self.peek(1)[0] == "NAME":
+            self.pos += 1
+            names = []
+            while self.peek()[0] == "NAME":
+                names.append(self.peek()[1])
+                self.pos += 1
+            self.expect(",")
+            body = self.binary(1)
+            _check_operands(True, body)
+            return [value, names, body]
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.peek()
+        self.pos += 1
+        if kind == "INT":
+            return ["INT", value]
+        if kind == "NAME":
+            if self.peek() != ("OP", "["):
+                return ["VAR", value]
+            self.pos += 1
+            index = self.binary(1)
+            _check_operands(False, index)
+            self.expect("]")
+            return ["ARR", "ARR_" + value, index]
+        if (kind, value) == ("OP", "("):
+            exp = self.binary(1)
+            self.expect(")")
+            return exp
         raise NotImplementedError
 
-    aexp1, op, aexp2 = in_str[:break_idxs[0]], in_str[break_idxs[0]:break_idxs[1]], in_str[break_idxs[1]:]
-    return [op, parse_aexp(aexp1, assignments, should_sub), parse_aexp(aexp2, assignments, should_sub)]
 
-assert parse_comp("x>=5") == ['>=', ['VAR', 'x'], ['INT', 5]]
-assert parse_comp("x<=5") == ['<=', ['VAR', 'x'], ['INT', 5]]
-assert parse_comp("x!=5") == ['!=', ['VAR', 'x'], ['INT', 5]]
-assert parse_comp("x=5") == ['=', ['VAR', 'x'], ['INT', 5]]
+def _check_operands(boolean, *operands):
+    for exp in operands:
+        if (exp[0] in _BOOL_OPS) != boolean:
+            raise NotImplementedError
 
 
-def parse_bexp(in_str, assignments=None, should_sub=False):
-    in_str = prune_whitespace(in_str, 1)
-    while in_str.startswith(" "):
-        in_str = in_str[1:]
-    while in_str.endswith(" "):
-        in_str = in_str[:-1]
-    
-    for quant in ['forall', 'exists']:
-        if in_str.startswith(quant + ' '):
-            end_vars = in_str.find(",")
-            start_vars = len(quant) + 1
-            quant_vars = [v for v in in_str[start_vars:end_vars].split()]
-            return [quant, quant_vars, parse_bexp(in_str[end_vars+1:], assignments, should_sub)]
-
-    for char_list in [["==>"], ["||"], ["&&"]]:
-        last_checked = len(in_str)
-        while last_checked != 0:
-            break_idxs = back_scan_for_phrases_outside_parens(in_str[:last_checked], char_list)
-            if break_idxs is not None: 
-                if back_scan_for_phrases_outside_parens(in_str[:break_idxs[0]], ['forall', 'exists']) is None:  # Do not yet process things still bound by a quantifier
-                    bexp1, op, bexp2 = in_str[:break_idxs[0]], in_str[break_idxs[0]:break_idxs[1]], in_str[break_idxs[1]:]
-                    return [op, parse_bexp(bexp1, assignments, should_sub), parse_bexp(bexp2, assignments, should_sub)]
-                else:
-                    last_checked = break_idxs[0]
-            else:
-                last_checked = 0
-    
-    if in_str[0] == "!":
-        return ["!", parse_bexp(in_str[1:], assignments, should_sub)]
-    if in_str[0] == "(" and in_str[-1] == ")":
-        return parse_bexp(in_str[1:-1], assignments, should_sub)
+@functools.lru_cache(maxsize=4096)
+def _parse(in_str):
+    return _Parser(in_str).parse()
+
 
+def _copy(exp):
+    # iterative: generated assertions nest thousands of levels deep
+    root = list(exp)
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        for i, e in enumerate(node):
+            if isinstance(e, list):
+                node[i] = list(e)
+                stack.append(node[i])
+    return root
 
-    return parse_comp(in_str, assignments, should_sub)
 
-assert parse_bexp("x>2 && y<4 || z=6") == ['||', ['&&', ['>', ['VAR', 'x'], ['INT', 2]], ['<', ['VAR', 'y'], ['INT', 4]]], ['=', ['VAR', 'z'], ['INT', 6]]]
-assert parse_bexp("x>2||y<4&&z=6") == ['||', ['>', ['VAR', 'x'], ['INT', 2]], ['&&', ['<', ['VAR', 'y'], ['INT', 4]], ['=', ['VAR', 'z'], ['INT', 6]]]]
-assert parse_bexp("(x>2||x<2)&&!(y>2||y<2)") == ['&&', ['||', ['>', ['VAR', 'x'], ['INT', 2]], ['<', ['VAR', 'x'], ['INT', 2]]], ['!', ['||', ['>', ['VAR', 'y'], ['INT', 2]], ['<', ['VAR', 'y'], ['INT', 2]]]]]
-assert parse_bexp("  forall i  j k, j>i && exists l, k<=l || k>l") == ['forall', ['i', 'j', 'k'], ['&&', ['>', ['VAR', 'j'], ['VAR', 'i']], ['exists', ['l'], ['||', ['<=', ['VAR', 'k'], ['VAR', 'l']], ['>', ['VAR', 'k'], ['VAR', 'l']]]]]]
-assert parse_bexp(" !( exists c b, c*c*b == n && c>1 && b>= 1 && c<pa) || pa * pa * (n / (pa * pa)) = n") == ['||', ['!', ['exists', ['c', 'b'], ['&&', ['&&', ['&&', ['=', ['*', ['*', ['VAR', 'c'], ['VAR', 'c']], ['VAR', 'b=']], ['VAR', 'n']], ['>', ['VAR', 'c'], ['INT', 1]]], ['>=', ['VAR', 'b'], ['INT', 1]]], ['<', ['VAR', 'c'], ['VAR', 'pa']]]]], ['=', ['*', ['*', ['VAR', 'pa'], ['VAR', 'pa']], ['/', ['VAR', 'n'], ['*', ['VAR', 'pa'], ['VAR', 'pa']]]], ['VAR', 'n']]]
+def _substitute(exp, assignments):
+    if exp[0] == "VAR":
+        return assignments.get(exp[1], exp)
+    if exp[0] in ("forall", "exists"):
+        return [exp[0], exp[1], _substitute(exp[2], assignments)]
+    return [_substitute(e, assignments) if isinstance(e, list) else e for e in exp]
+
+
+def parse_exp(in_str, assignments=None, should_sub=False):
+    """
+    Parse an arithmetic or boolean expression. Parses are cached by source string, and every call
+    returns a fresh tree (callers key statements by identity). With should_sub, variables found in
+    assignments are replaced by their values there.
+    """
+    exp = _copy(_parse(in_str))
+    return _substitute(exp, assignments) if should_sub and assignments else exp
+
+
+def parse_aexp(in_str, assignments=None, should_sub=False):
+    exp = parse_exp(in_str, assignments, should_sub)
+    _check_operands(False, exp)
+    return exp
+
+
+def parse_comp(in_str, assignments=None, should_sub=False):
+    exp = parse_exp(in_str, assignments, should_sub)
+    if _BINARY.get(exp[0]) != _COMPARISON:
+        raise NotImplementedError
+    return exp
+
+
+def parse_bexp(in_str, assignments=None, should_sub=False):
+    exp = parse_exp(in_str, assignments, should_sub)
+    _check_operands(True, exp)
+    return exp
 
 
 def parse_assn(in_str):    
@@ -168,3 +213,110 @@ def parse_assn(in_str):
 
     return parse_bexp(in_str)
 
+
+_STMT_TOKENS = re.compile(r"\b(?:if|then|else|while|do|end)\b|;")
+
+def parse_simple_stmt(in_str):
+    """
+    Parse a semicolon statement: ["assert", ASSN], ["store", ARR_NAME, AEXP, AEXP] for an array write,
+    or ["assign", [VAR...], [AEXP...]] for (possibly parallel) assignment.
+    """
+    in_str = in_str.strip()
+    if in_str.startswith("assert "):
+        return ["assert", parse_assn(in_str[len("assert "):])]
+
+    assign_idx = in_str.find(":=")
+    if assign_idx == -1:
+        raise NotImplementedError
+    lhs, rhs = in_str[:assign_idx], in_str[assign_idx+2:]
+
+    fb = lhs.find("[")
+    if fb != -1:
+        return ["store", "ARR_" + prune_whitespace(lhs[:fb]), parse_aexp(lhs[fb+1:lhs.rfind("]")]), parse_aexp(rhs)]
+
+    var_strs, exp_strs = lhs.split(","), rhs.split(",")
+    if len(var_strs) != len(exp_strs):
+        raise NotImplementedError
+    return ["assign", [prune_whitespace(v) for v in var_strs], [parse_aexp(e) for e in exp_strs]]
+
+
+def parse_stmts(in_str):
+    """
+    Parse a program body into a block (a list of statements) in a single scan over its keywords.
+    Compound statements are ["if", BEXP, BLOCK], ["ifelse", BEXP, BLOCK, BLOCK] and ["while", BEXP, BLOCK];
+    the rest are as returned by parse_simple_stmt.
+    """
+    tokens = [(m.group(), m.start(), m.end()) for m in _STMT_TOKENS.finditer(in_str)]
+    tokens.append((None, len(in_str), len(in_str)))
+
+    def parse_block(tok_idx, text_idx, terminators):
+        block = []
+        while True:
+            tok, tok_start, tok_end = tokens[tok_idx]
+            if tok in terminators:
+                if in_str[text_idx:tok_start].strip():
+                    raise NotImplementedError
+                return block, tok_idx
+
+            if tok == ";":
+                block.append(parse_simple_stmt(in_str[text_idx:tok_start]))
+                tok_idx, text_idx = tok_idx + 1, tok_end
+
+            elif tok in ("if", "while"):
+                if in_str[text_idx:tok_start].strip():
+                    raise NotImplementedError
+                guard_tok, body_tok = tokens[tok_idx + 1], ("then" if tok == "if" else "do")
+                if guard_tok[0] != body_tok:
+                    raise NotImplementedError
+                bexp = parse_bexp(in_str[tok_end:guard_tok[1]])
+                body, tok_idx = parse_block(tok_idx + 2, guard_tok[2], ("else", "end") if tok == "if" else ("end",))
+
+                if tokens[tok_idx][0] == "else":
+                    else_body, tok_idx = parse_block(tok_idx + 1, tokens[tok_idx][2], ("end",))
+                    block.append(["ifelse", bexp, body, else_body])
+                elif tok == "if":
+                    block.append(["if", bexp, body])
+                else:
+                    block.append(["while", bexp, body])
+                tok_idx, text_idx = tok_idx + 1, tokens[tok_idx][2]
+
+            else:
+                raise NotImplementedError
+
+    block, _ = parse_block(0, 0, (None,))
+    return block
+
+
+def format_exp(exp):
+    """
+    Render a parsed expression back as source text, fully parenthesized.
+    """
+    op = exp[0]
+    if op == "INT":
+        return str(exp[1])
+    if op == "VAR":
+        return exp[1]
+    if op == "ARR":
+        return exp[1][len("ARR_"):] + ("[" + format_exp(exp[2]) + "]" if len(exp) == 3 else "")
+    if op in ("forall", "exists"):
+        return op + " " + " ".join(exp[1]) + ", " + format_exp(exp[2])
+    if op == "!":
+        return "!(" + format_exp(exp[1]) + ")"
+    if op == "pre":
+        return "pre " + format_exp(exp[1])
+    return "(" + format_exp(exp[1]) + " " + op + " " + format_exp(exp[2]) + ")"
+
+
+def format_stmt(stmt):
+    """
+    Render the head of a parsed statement (without the blocks of if/while) as source text.
+    """
+    if stmt[0] == "assert":
+        return "assert " + format_exp(stmt[1])
+    if stmt[0] == "store":
+        return stmt[1][len("ARR_"):] + "[" + format_exp(stmt[2]) + "] := " + format_exp(stmt[3])
+    if stmt[0] == "assign":
+        return ", ".join(stmt[1]) + " := " + ", ".join(format_exp(e) for e in stmt[2])
+    if stmt[0] == "while":
+        return "while " + format_exp(stmt[1]) + " do"
+    return "if " + format_exp(stmt[1]) + " then"
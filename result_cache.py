@@ -0,0 +1,119 @@
+"""
+Persistent, content-addressed cache of verification results, shared by every run that points at the same
+directory (CI jobs, developer machines, parallel workers). Two kinds of entries are kept in one SQLite
+database: whole results, keyed on the whitespace-pruned program text, the unroll count and the options,
+and single assertion checks, keyed on the content of the path condition and negated assertion, so an
+edit to one part of a program only re-solves the queries it changes.
+Every key also covers the engine version (a hash of the engine's source files) and the z3 version, so
+entries written by other code are never read. The database is bounded to max_size bytes of values by
+evicting the least recently used entries; SQLite's locking (in WAL mode) makes concurrent use safe.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import z3
+
+ENGINE_MODULES = ("see.py", "solver.py", "symbolic.py", "search.py", "program_parser.py", "interpreter.py")
+DEFAULT_SIZE = 256
+
+_engine_version = None
+
+def engine_version():
+	"""
+	A hash of the engine's source files and the z3 version, computed once per process.
+	"""
+	global _engine_version
+	if _engine_version is None:
+		digest = hashlib.sha256(z3.get_version_string().encode())
+		directory = os.path.dirname(os.path.abspath(__file__))
+		for module in ENGINE_MODULES:
+			with open(os.path.join(directory, module), "rb") as source:
+				digest.update(source.read())
+		_engine_version = digest.hexdigest()
+	return _engine_version
+
+
+def cache_key(*parts):
+	"""
+	The key of an entry described by JSON-serialisable parts.
+	"""
+	return hashlib.sha256(json.dumps([engine_version()] + list(parts), sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+	"""
+	The cache in directory path. Query results are written in batches by flush; results are written at once.
+	"""
+
+	def __init__(self, path, max_size=DEFAULT_SIZE * 1024 * 1024):
+		os.makedirs(path, exist_ok=True)
+		self.max_size = max_size
+		self.connection = sqlite3.connect(os.path.join(path, "results.sqlite"), timeout=60)
+		self.connection.execute("PRAGMA journal_mode=WAL")
+		with self.connection:
+			self.connection.execute("CREATE TABLE IF NOT EXISTS entries "
+				"(key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+			self.connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+		self.pending = {}
+		self.touched = set()
+		self.hits = self.misses = 0
+
+	def get(self, key):
+		"""
+		The value stored under key, or None.
+		"""
+		value = self.pending.get(key)
+		if value is None:
+			row = self.connection.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+			value = row and json.loads(row[0])
+		if value is None:
+			self.misses += 1
+		else:
+			self.hits += 1
+			self.touched.add(key)
+		return value
+
+	def put(self, key, value, flush=False):
+		"""
+		Store value (JSON-serialisable) under key, now if flush or else on the next flush.
+		"""
+		self.pending[key] = value
+		if flush:
+			self.flush()
+
+	def flush(self):
+		"""
+		Write the pending entries and access times, then evict the least recently used entries while the
+		database is over max_size.
+		"""
+		if not self.pending and not self.touched:
+			return
+		now = time.time()
+		rows = [(key, text, len(text), now) for key, text in
+			((key, json.dumps(value, sort_keys=True)) for key, value in self.pending.items())]
+		with self.connection:
+			self.connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", rows)
+			self.connection.executemany("UPDATE entries SET accessed = ? WHERE key = ?",
+				[(now, key) for key in self.touched - self.pending.keys()])
+			total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+			if total > self.max_size:
+				evict = []
+				for key, size in self.connection.execute("SELECT key, size FROM entries ORDER BY accessed"):
+					if total <= self.max_size:
+						break
+					evict.append((key,))
+					total -= size
+				self.connection.executemany("DELETE FROM entries WHERE key = ?", evict)
+		self.pending.clear()
+		self.touched.clear()
+
+	def stats(self):
+		return {"hits": self.hits, "misses": self.misses}
+
+	def close(self):
+		self.flush()
+		self.connection.close()
@@ -0,0 +1,128 @@
+"""
+Worklists deciding which pending state the executor explores next.
+push takes the successors of one state in their preferred order (the guard's negation first);
+pop returns the next state to run.
+"""
+
+import heapq
+import random
+from collections import deque
+
+class DFS:
+	def __init__(self, **kwargs):
+		self.states = []
+
+	def push(self, states):
+		self.states.extend(reversed(states))
+
+	def pop(self):
+		return self.states.pop()
+
+	def __len__(self):
+		return len(self.states)
+
+
+class BFS:
+	def __init__(self, **kwargs):
+		self.states = deque()
+
+	def push(self, states):
+		self.states.extend(states)
+
+	def pop(self):
+		return self.states.popleft()
+
+	def __len__(self):
+		return len(self.states)
+
+
+class RandomPath:
+	"""
+	KLEE's random-path search: keep the execution tree whose leaves are the pending states and pick the next
+	state by walking down from the root, choosing uniformly among the subtrees that still hold a pending
+	state. A state's chance halves at every fork above it, so states on short paths are not crowded out by
+	the many states of a deep, heavily forking subtree.
+	"""
+
+	def __init__(self, seed=None, **kwargs):
+		self.root = _Node(None)
+		self.rng = random.Random(seed)
+		self.parent = None
+
+	def push(self, states):
+		# the successors replace the state popped last; a fork becomes an inner node holding them
+		parent, self.parent = self.parent or self.root, None
+		if not states:
+			return
+		if len(states) > 1:
+			node = _Node(parent)
+			parent.children.append(node)
+			parent = node
+		for state in states:
+			parent.children.append(_Node(parent, state))
+		while parent is not None:
+			parent.count += len(states)
+			parent = parent.parent
+
+	def pop(self):
+		node = self.root
+		while node.children is not None:
+			node.children = [child for child in node.children if child.count]
+			node = self.rng.choice(node.children)
+		node.parent.children.remove(node)
+		self.parent = node.parent
+		leaf = node
+		while node is not None:
+			node.count -= 1
+			node = node.parent
+		return leaf.state
+
+	def __len__(self):
+		return self.root.count
+
+
+class _Node:
+	__slots__ = ("parent", "children", "state", "count")
+
+	def __init__(self, parent, state=None):
+		# a leaf holds a pending state; an inner node holds children
+		self.parent, self.state = parent, state
+		self.children = [] if state is None else None
+		self.count = 0 if state is None else 1
+
+
+class CoverageGuided:
+	"""
+	Prefer states about to run the statement executed least often so far; ties go to the newest state.
+	"""
+
+	def __init__(self, coverage=None, key=None, **kwargs):
+		self.states = []
+		self.coverage = coverage if coverage is not None else {}
+		self.key = key
+		self.seq = 0
+
+	def push(self, states):
+		for state in states:
+			self.seq += 1
+			heapq.heappush(self.states, (self.coverage.get(self.key(state), 0), -self.seq, state))
+
+	def pop(self):
+		# counts only grow, so re-queue an entry whose statement was covered since it was pushed
+		while True:
+			count, seq, state = heapq.heappop(self.states)
+			current = self.coverage.get(self.key(state), 0)
+			if current == count or not self.states:
+				return state
+			heapq.heappush(self.states, (current, seq, state))
+
+	def __len__(self):
+		return len(self.states)
+
+
+STRATEGIES = {"dfs": DFS, "bfs": BFS, "random": RandomPath, "coverage": CoverageGuided}
+
+def make_worklist(strategy, **kwargs):
+	if strategy not in STRATEGIES:
+		raise ValueError(f"unknown search strategy {strategy!r}, expected one of {', '.join(STRATEGIES)}")
+	return STRATEGIES[strategy](**kwargs)
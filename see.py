@@ -13,16 +13,31 @@
 #	Program no longer has postconditions (can have preconditions though)
 
 # Design
-	# parse iteratively. handle if/while statements recursively.
-
+	# parse the body once into a statement tree. run each path's straight-line code up to the next if/while guard,
+	# then queue both successor states on a worklist.
+
+import argparse
+from contextlib import contextmanager
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import queue
 import sys
-import os
+import resource
+import time
 
 from program_parser import *
-from solver import exp_to_z3
+from solver import exp_to_z3, translation_cache, solver_stats, base_solver, PathSolver, IncrementalSolver, QueryCache, Slicer, \
+	Portfolio
+from search import make_worklist, STRATEGIES
+from instrument import Profile, statement_index, print_report
+from interpreter import Interpreter, format_inputs, inputs_from_model
+from symbolic import mk, from_exp, is_concrete, free_symbols, select_indices, expand_quantifiers, term_digest, \
+	num_terms
+from result_cache import ResultCache, cache_key, DEFAULT_SIZE
 from z3 import *
 
-prints = []
 
 def parse_head(program):
 	# useful for solver
@@ -54,234 +69,1021 @@ def parse_head(program):
 	return program_idx_start, program_idx_end, name, var_list, preconditions
 
 
-def check_assertion(solver, assignments, var_list, name):
-	for k, v in assignments.items():
-		if isinstance(v, list):
-			solver.add(Int(k) == exp_to_z3(v))
-		# z3 array
+class State:
+	"""
+	A pending path: its program point (a chain of (block, idx, next) frames), symbolic store,
+	path condition (the tuple of guard Terms taken so far) and trace (the branch taken at each guard,
+	0 for the negation and 1 for the guard, which identifies the path independently of any Terms).
+	"""
+	__slots__ = ('point', 'assignments', 'path', 'trace')
+
+	def __init__(self, point, assignments, path, trace=()):
+		self.point = point
+		self.assignments = assignments
+		self.path = path
+		self.trace = trace
+
+
+def point_key(state):
+	"""
+	The statement a state runs next, used to count statement coverage.
+	"""
+	point = state.point
+	while point is not None and point[1] >= len(point[0]):
+		point = point[2]
+	if point is None:
+		return None
+	stmt = point[0][point[1]]
+	return id(stmt[1]) if stmt[0] == 'loop' else id(stmt)
+
+
+def assign(stmt, assignments, define=None):
+	"""
+	Apply an assignment or array store to assignments in place.
+	define, if given, maps (variable, value) to the Term actually stored (e.g. an SSA symbol).
+	"""
+	if stmt[0] == 'store':
+		arr_name = stmt[1]
+		arr = assignments.get(arr_name) or mk('ARR', arr_name)
+		value = mk('STORE', arr, from_exp(stmt[2], assignments), from_exp(stmt[3], assignments))
+		assignments[arr_name] = define(arr_name, value) if define else value
+
+	else:
+		values = [from_exp(exp, assignments) for exp in stmt[2]]
+		for var, value in zip(stmt[1], values):
+			assignments[var] = define(var, value) if define else value
+
+
+def merge_size(stmt, sizes):
+	"""
+	Number of assignments in an if/ifelse whose branches can be merged into one state, or None if a
+	branch contains a loop or an assertion (those need a path of their own). sizes caches the answer by statement.
+	"""
+	key = id(stmt)
+	if key not in sizes:
+		size = 0
+		for s in stmt[2] + (stmt[3] if stmt[0] == 'ifelse' else []):
+			if s[0] in ('if', 'ifelse'):
+				inner = merge_size(s, sizes)
+				if inner is None:
+					size = None
+					break
+				size += inner
+			elif s[0] in ('assign', 'store'):
+				size += 1
+			else:
+				size = None
+				break
+		sizes[key] = size
+	return sizes[key]
+
+
+def exec_merged(block, assignments):
+	"""
+	Run a mergeable block on a copy of assignments, merging nested if/ifelse statements, and return it.
+	"""
+	assignments = dict(assignments)
+	for stmt in block:
+		if stmt[0] in ('if', 'ifelse'):
+			assignments = merge_if(stmt, assignments)
 		else:
-			solver.add(Array(k, IntSort(), IntSort()) == v)
-
-	if solver.check() == sat:
-		vars_to_print = {}
-		m = solver.model()
-		for d in m.decls():
-			if d.name() in var_list:
-				vars_to_print[var_list.index(d.name())] = m[d]
-
-		violation = f"{name}"
-		for i in range(len(var_list)):
-			if i in vars_to_print:
-				violation += " "
-				violation += str(vars_to_print[i])
-
-		prints.append(violation)
-
-def parse_body(program, num_unrolls, program_idx_start, program_idx_end, name, solver, assignments, var_list):
-	# check for semicolon statement
-	if program_idx_start < program_idx_end:
-		if not program[program_idx_start:].startswith("if") and not program[program_idx_start:].startswith("while"):
-			stmt_idx_end = program[program_idx_start:].find(";")
-			stmt = program[program_idx_start:program_idx_start + stmt_idx_end]
-
-
-			# 4 types of semicolon statements: assert, array assignment (with "[" before ":="), double assignment (with "," before ":="), and single assignment
-			if stmt.find("assert") != -1:
-				assertion = Not(exp_to_z3(parse_assn(stmt[7:])))
-				solver.push()
-				solver.add(assertion)
-				check_assertion(solver, assignments, var_list, name)
-				solver.pop()
-
-			elif stmt.find("[") != -1 and stmt.find("[") < stmt.find(":="):
-				arr_name = "ARR_" + stmt[:stmt.find("[")]
-				if arr_name not in assignments:
-					assignments[arr_name] = exp_to_z3(['STORE', arr_name, parse_aexp(stmt[stmt.find("[")+1:stmt.find("]")], assignments, True),\
-					 parse_aexp(stmt[stmt.find(":=")+3:], assignments, True)])
-
-				else:
-					assignments[arr_name] = exp_to_z3(['STORE', assignments[arr_name], parse_aexp(stmt[stmt.find("[")+1:stmt.find("]")], assignments, True),\
-					 parse_aexp(stmt[stmt.find(":=")+3:], assignments, True)])
-
-			elif stmt.find(",") != -1 and stmt.find(",") < stmt.find(":="):
-				var1, var2 = stmt[:stmt.find(",")], stmt[stmt.find(",")+2:stmt.find(":=")-1]
-				if var1 not in assignments:
-					assignments[var1] = parse_aexp(stmt[stmt.find(":=")+3:stmt.rfind(",")])
-				else:
-					assignments[var1] = parse_aexp(stmt[stmt.find(":=")+3:stmt.rfind(",")], assignments, True)
+			assign(stmt, assignments)
+	return assignments
+
+
+def merge_if(stmt, assignments):
+	"""
+	Execute both branches of a mergeable if/ifelse and join them into one store of If(cond, v_then, v_else)
+	terms. Values both branches agree on are kept as they are.
+	"""
+	bexp = from_exp(stmt[1], assignments)
+	then_assignments = exec_merged(stmt[2], assignments)
+	else_assignments = exec_merged(stmt[3], assignments) if stmt[0] == 'ifelse' else assignments
+
+	merged = {}
+	for var in then_assignments.keys() | else_assignments.keys():
+		unset = mk('ARR', var) if var.startswith("ARR_") else mk('VAR', var)
+		v_then, v_else = then_assignments.get(var, unset), else_assignments.get(var, unset)
+		merged[var] = v_then if v_then is v_else else mk('ite', bexp, v_then, v_else)
+	return merged
+
+
+def is_constant(bexp):
+	return isinstance(bexp, bool) or is_true(bexp) or is_false(bexp)
+
+
+def load_program(program):
+	"""
+	Parse whitespace-pruned program text into its name, variable list, preconditions and body.
+	"""
+	program_idx_start, program_idx_end, name, var_list, preconditions = parse_head(program)
+	body = parse_stmts(program[program_idx_start:program_idx_end])
+	return name, var_list, preconditions, body
+
+
+QUANTIFIER_MODES = ("encode", "expand")
+
+class Engine:
+	"""
+	One verification run of a program: explores its paths up to num_unrolls iterations per loop entry and
+	collects the assertion violations. All state lives on the instance, so engines can be created and run
+	any number of times in one process.
+	Options: strategy/seed (search order), prune (cut infeasible branches), merge_limit (if/else state merging),
+	incremental (SSA solver), query_cache, slicing, jobs/split_steps (parallel exploration),
+	profile/slowest_queries/smt_dir (instrumentation, see instrument.Profile), trace (print the branches,
+	assertions and finished paths to stderr as they happen), prepass (run that many random inputs through
+	the concrete interpreter first; symbolic execution only runs if they find no violation), confirm
+	(replay each symbolic counterexample through the interpreter), quantifiers/quantifier_limit
+	("expand" rewrites the quantifiers of assertions, see check_expanded; "encode" sends them to z3 as they are),
+	query_timeout and timeout (seconds per solver query and for the whole run; assertion checks that end
+	unknown are reported in the result's "unknown" list), portfolio (race slow queries, see solver.Portfolio) and
+	cache_dir/cache_size (a persistent cache of results and assertion checks of at most cache_size MB, see
+	result_cache.ResultCache), distinct (report each input at most once per assertion), max_violations (stop
+	exploring once that many are found) and on_violation (called with each violation and whether it was
+	confirmed as soon as it is found; not passed to worker processes, which report theirs as they finish).
+	"""
+
+	def __init__(self, program, num_unrolls, strategy="dfs", prune=False, seed=None, merge_limit=0, incremental=False,
+			query_cache=True, slicing=False, jobs=1, split_steps=256, profile=False, slowest_queries=0, smt_dir=None,
+			trace=False, prepass=0, confirm=False, quantifiers="encode", quantifier_limit=64, query_timeout=None, timeout=None,
+			portfolio=False, cache_dir=None, cache_size=DEFAULT_SIZE, distinct=False, max_violations=None, on_violation=None):
+		if quantifiers not in QUANTIFIER_MODES:
+			raise ValueError(f"unknown quantifier mode {quantifiers!r}")
+		if strategy not in STRATEGIES:
+			raise ValueError(f"unknown search strategy {strategy!r}")
+		if max_violations is not None and max_violations < 1:
+			raise ValueError("max_violations must be at least 1")
+		if smt_dir is not None and not (profile and slowest_queries > 0):
+			raise ValueError("smt_dir needs profile and slowest_queries")
+		self.program = prune_whitespace(program, 1)
+		self.num_unrolls = num_unrolls
+		self.strategy, self.seed = strategy, seed
+		self.prune, self.merge_limit = prune, merge_limit
+		self.incremental, self.query_cache, self.slicing = incremental, query_cache, slicing
+		self.jobs, self.split_steps = jobs, split_steps
+		self.profiling, self.slowest_queries, self.smt_dir, self.trace = profile, slowest_queries, smt_dir, trace
+		self.prepass, self.confirm = prepass, confirm
+		self.quantifiers, self.quantifier_limit = quantifiers, quantifier_limit
+		self.query_timeout, self.timeout, self.portfolio = query_timeout, timeout, portfolio
+		self.cache_dir, self.cache_size = cache_dir, cache_size
+		self.results = ResultCache(cache_dir, cache_size * 1024 * 1024) if cache_dir else None
+		self.distinct, self.max_violations, self.on_violation = distinct, max_violations, on_violation
+		start = time.perf_counter()
+		self.name, self.var_list, self.preconditions, self.body = load_program(self.program)
+		self.parse_time = time.perf_counter() - start
+		self.stmt_index = statement_index(self.body)
+		self.merge_sizes = {}
+		self.reset()
+
+	def options(self):
+		return {"strategy": self.strategy, "prune": self.prune, "seed": self.seed, "merge_limit": self.merge_limit,
+			"incremental": self.incremental, "query_cache": self.query_cache, "slicing": self.slicing,
+			"jobs": self.jobs, "split_steps": self.split_steps, "profile": self.profiling,
+			"slowest_queries": self.slowest_queries, "smt_dir": self.smt_dir, "trace": self.trace,
+			"prepass": self.prepass, "confirm": self.confirm, "quantifiers": self.quantifiers,
+			"quantifier_limit": self.quantifier_limit, "query_timeout": self.query_timeout, "timeout": self.timeout,
+			"portfolio": self.portfolio, "cache_dir": self.cache_dir, "cache_size": self.cache_size,
+			"distinct": self.distinct, "max_violations": self.max_violations}
+
+	def reset(self):
+		self.violations = []
+		self.confirmed = []
+		self.violation_keys, self.reported = [], set()
+		self.unknowns = []
+		self.stats = {"paths": 0, "pruned": 0, "merged": 0, "concrete": 0, "prepass": 0, "expanded": 0, "instantiated": 0,
+			"unknown": 0, "cached": 0, "unexplored": 0, "queries": 0, "solve_time": 0.0}
+		self.feasibility_cache = {}
+		self.symbols, self.indices, self.digests = {}, {}, {}
+		self.precondition_digests = None
+		self.coverage = {}
+		self.path_solver = None
+		self.frontier = None
+		self.deadline, self.memory_limit, self.exhausted = None, None, None
+		self.profile = None
+		self.worker_translations = dict.fromkeys(("hits", "misses", "evictions"), 0)
+		if self.profiling or self.trace:
+			self.profile = Profile(self.slowest_queries, trace=sys.stderr if self.trace else None)
+
+	def make_path_solver(self):
+		solver = Solver()
+		base_terms = [from_exp(precondition) for precondition in self.preconditions]
+		base = [exp_to_z3(term) for term in base_terms]
+		for precondition in base:
+			solver.add(precondition)
+		path_solver = IncrementalSolver(solver) if self.incremental else PathSolver(solver)
+		# SSA symbols are only pinned down by the solver's definitions, so with them models are not
+		# re-evaluated and constraints cannot be split by the variables they mention
+		if self.query_cache:
+			path_solver = QueryCache(path_solver, None if self.incremental else base)
+		if self.slicing and not self.incremental:
+			path_solver = Slicer(path_solver, base_terms)
+		solver = base_solver(path_solver)
+		solver.profile = self.profile
+		solver.query_timeout, solver.deadline = self.query_timeout, self.deadline
+		if self.portfolio:
+			solver.portfolio = Portfolio()
+		return path_solver
+
+	def run(self):
+		"""
+		Explore the whole program and return the result as a dict of plain values.
+		A result found in the persistent cache is returned as it was stored, with "cached" set, and its
+		violations and statistics are copied into the engine as if it had run.
+		"""
+		self.reset()
+		translations = translation_cache.stats()
+		start_time = time.perf_counter()
+		key = self.result_key()
+		cached = key and self.results.get(key)
+		if cached:
+			return self.cached_result(cached, start_time)
+		if self.timeout is not None:
+			self.deadline = start_time + self.timeout
+
+		# symbolic execution only runs when the concrete pre-pass found nothing
+		concrete = self.prepass and self.run_prepass()
+		if not concrete and self.jobs > 1:
+			self.explore_parallel()
+		elif not concrete:
+			self.path_solver = self.make_path_solver()
+			with self.timing_translation():
+				self.stats["unexplored"] = len(self.explore())
+			self.count_queries()
+
+		result = self.result(start_time, translations)
+		if key and not result["timed_out"] and not result["unknown"]:
+			self.results.put(key, result, flush=True)
+		return result
+
+	def cached_result(self, cached, start_time):
+		"""
+		Copy a result found in the persistent cache into the engine, report its violations to on_violation
+		and return it, with "cached" set.
+		"""
+		self.violations[:] = cached["violations"]
+		self.confirmed[:] = cached.get("confirmed", [None] * len(self.violations))
+		self.stats.update(cached["stats"])
+		if self.on_violation is not None:
+			for violation, confirmed in zip(cached["violations"], cached.get("confirmed", repeat(None))):
+				self.on_violation(violation, confirmed)
+		return dict(cached, time=time.perf_counter() - start_time, cached=True)
+
+	def result_key(self):
+		"""
+		The persistent cache key of this run's result, or None if it is not cached: without a cache, when
+		profiling or tracing (their output is the point of the run), and when random choices are not seeded.
+		"""
+		if self.results is None or self.profiling or self.trace or \
+				(self.seed is None and (self.prepass or self.strategy == "random")):
+			return None
+		options = {k: v for k, v in self.options().items() if k not in _UNKEYED_OPTIONS}
+		return cache_key("result", self.program, self.num_unrolls, options)
+
+	def query_key(self, path, negated):
+		"""
+		The persistent cache key of an assertion check, or None if it is not cached: without a cache, with
+		incremental (SSA symbols are named per run) and with confirm (a cached check has no model to replay).
+		"""
+		if self.results is None or self.incremental or self.confirm:
+			return None
+		if self.precondition_digests is None:
+			self.precondition_digests = [term_digest(from_exp(pre), self.digests) for pre in self.preconditions]
+		return cache_key("query", self.var_list, self.precondition_digests,
+			[term_digest(guard, self.digests) for guard in path], term_digest(negated, self.digests))
+
+	def interpreter(self):
+		return Interpreter(self.var_list, self.preconditions, self.body, self.num_unrolls)
+
+	def run_prepass(self):
+		"""
+		Look for violations on prepass random inputs with the concrete interpreter, and record them.
+		Returns whether any was found.
+		"""
+		for stmt, inputs in self.interpreter().search(self.prepass, self.seed):
+			self.record_violation(format_inputs(self.name, self.var_list, inputs), True if self.confirm else None, stmt)
+		self.stats["prepass"] = len(self.violations)
+		return bool(self.violations)
+
+	def deepen(self, max_unrolls=None, time_budget=None, memory_budget=None):
+		"""
+		Iterative deepening from num_unrolls upwards: after each depth, raise the unroll bound by one and explore
+		only the paths the previous depth cut off at a loop whose unroll budget was spent, resuming them from the
+		states saved there. Paths finished at a shallower depth are not explored (or their assertions checked)
+		again, and the solver and its caches are kept across depths. Runs in this process regardless of jobs.
+		As in run, a violation found by the prepass skips symbolic execution, and a complete result is kept
+		in the persistent cache (keyed on max_unrolls too; the budgets do not change a result they did not cut).
+		Stops after the first depth that finds a violation, after max_unrolls, once no path was cut off (deeper
+		depths add nothing), or when time_budget seconds (or the timeout option, whichever is shorter) or
+		memory_budget MB of peak memory are exceeded.
+		The result is that of run, with the deepest depth fully explored (None if none was), the reason for
+		stopping and the paths, violations and time per depth.
+		"""
+		self.reset()
+		translations = translation_cache.stats()
+		start_time = time.perf_counter()
+		key = self.result_key()
+		key = key and cache_key("deepen", key, max_unrolls)
+		cached = key and self.results.get(key)
+		if cached:
+			return self.cached_result(cached, start_time)
+		initial_unrolls = self.num_unrolls
+		budgets = [budget for budget in (time_budget, self.timeout) if budget is not None]
+		self.deadline = start_time + min(budgets) if budgets else None
+		self.memory_limit = memory_budget
+		self.path_solver = self.make_path_solver()
+
+		frontier = [State((self.body, 0, None), {}, ())]
+		depth, stopped, depths = None, None, []
+		if self.prepass and self.run_prepass():
+			stopped = "violation"
+		with self.timing_translation():
+			while not stopped:
+				depth_start, paths, found = time.perf_counter(), self.stats["paths"], len(self.violations)
+				self.frontier = []
+				states = []
+				for state in frontier:
+					if self.prune and state.path and not self.is_feasible(state.path):
+						self.stats["pruned"] += 1
+					else:
+						states.append(state)
+				self.explore(states)
+				if self.exhausted:
+					stopped = self.exhausted
+					break
 
-				if var2 not in assignments:
-					assignments[var2] = parse_aexp(stmt[stmt.rfind(",")+2:])
-				else:
-					assignments[var2] = parse_aexp(stmt[stmt.rfind(",")+2:], assignments, True)
+				depth = self.num_unrolls
+				depths.append({"depth": depth, "paths": self.stats["paths"] - paths,
+					"violations": len(self.violations) - found, "time": time.perf_counter() - depth_start})
+				frontier = self.frontier
+				if len(self.violations) > found:
+					stopped = "violation"
+				elif not frontier:
+					stopped = "complete"
+				elif max_unrolls is not None and depth >= max_unrolls:
+					stopped = "max_unrolls"
+				if stopped:
+					break
+				self.num_unrolls += 1
+		self.count_queries()
+
+		result = self.result(start_time, translations)
+		result.update(num_unrolls=depth, depth=depth, stopped=stopped, depths=depths)
+		self.num_unrolls, self.frontier = initial_unrolls, None
+		if key and stopped not in ("time", "memory") and not result["timed_out"] and not result["unknown"]:
+			self.results.put(key, result, flush=True)
+		return result
+
+	def out_of_budget(self):
+		"""
+		Record in exhausted, and return, which budget of deepen has run out, if any.
+		"""
+		if self.deadline is not None and time.perf_counter() > self.deadline:
+			self.exhausted = "time"
+		elif self.memory_limit is not None and \
+				resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 > self.memory_limit:
+			self.exhausted = "memory"
+		return self.exhausted
+
+	def result(self, start_time, translations):
+		"""
+		The result dict of a run that started at start_time, with translation_cache statistics then.
+		"""
+		result = {"name": self.name, "num_unrolls": self.num_unrolls, "violations": list(self.violations),
+			"stats": dict(self.stats), "time": time.perf_counter() - start_time}
+		result["unknown"] = [text for _, text in self.unknowns]
+		result["timed_out"] = self.exhausted == "time"
+		if self.confirm:
+			result["confirmed"] = list(self.confirmed)
+		if self.path_solver is not None:
+			result["solver"] = solver_stats(self.path_solver)
+		now = translation_cache.stats()
+		result["translation_cache"] = {k: now[k] - translations[k] + v for k, v in self.worker_translations.items()}
+		if self.results is not None:
+			self.results.flush()
+			result["result_cache"] = self.results.stats()
+		if self.profiling:
+			if self.jobs == 1:
+				self.finish_profile()
+			self.profile.smt_dir = self.smt_dir
+			result["profile"] = self.profile.report(self.stmt_index)
+		return result
+
+	@contextmanager
+	def timing_translation(self):
+		"""
+		While profiling, add the time spent translating Terms to z3 to the profile's translate timer.
+		"""
+		if self.profile is None or translation_cache.timing:
+			yield
+			return
+		translation_cache.timing, start = True, translation_cache.translate_time
+		try:
+			yield
+		finally:
+			translation_cache.timing = False
+			self.profile.timers["translate"] += translation_cache.translate_time - start
+
+	def finish_profile(self, replayed=None):
+		"""
+		Copy the parse time, path statistics, live term count and statement coverage (less the replayed hits)
+		into the profile.
+		"""
+		self.profile.timers["parse"] = self.parse_time
+		self.profile.timers["solve"] = self.stats["solve_time"]
+		self.profile.counters["paths"] = self.stats["paths"]
+		self.profile.counters["queries"] = self.stats["queries"]
+		self.profile.counters["terms"] = num_terms()
+		for key, hits in self.coverage.items():
+			hits -= replayed.get(key, 0) if replayed else 0
+			if hits:
+				self.profile.statements[self.stmt_index[key][0]] = hits
+
+	def count_queries(self):
+		"""
+		Add the queries that reached z3, and the time spent in them, to the path statistics.
+		"""
+		solver = base_solver(self.path_solver)
+		self.stats["queries"] += solver.queries
+		self.stats["solve_time"] += solver.solve_time
+
+	def check_assertion(self, path, assertion, stmt=None):
+		"""
+		Record a violation if assertion (the Term of assert statement stmt on this path) can be false, and
+		return the solver's result. With confirm, whether the interpreter reproduces it on the model's inputs
+		is recorded in confirmed.
+		"""
+		negated = mk('!', assertion)
+		key = self.query_key(path, negated)
+		cached = key and self.results.get(key)
+		if cached:
+			self.stats["cached"] += 1
+			if cached["res"] == "sat":
+				self.record_violation(" ".join([self.name] + cached["values"]), None, stmt)
+			return sat if cached["res"] == "sat" else unsat
+
+		if self.quantifiers == "expand":
+			res, m = self.check_expanded(path, negated)
+		else:
+			res, m = self.path_solver.check(path, negated)
+
+		values = []
+		if res == sat:
+			# inputs the path overwrites or never reads are not in the model; any value of theirs will do
+			values = [str(m.eval(translation_cache.symbol(var, 'Array' if var.startswith("ARR_") else 'Int'),
+				model_completion=True)) for var in self.var_list]
+
+			confirmed = None
+			if self.confirm:
+				failed = self.interpreter().run(inputs_from_model(m, self.var_list))
+				confirmed = any(s is stmt for s in failed or ())
+			self.record_violation(" ".join([self.name] + values), confirmed, stmt)
+		if key and res != unknown:
+			self.results.put(key, {"res": str(res), "values": values})
+		return res
+
+	def record_violation(self, violation, confirmed, stmt=None):
+		"""
+		Record a violation of assert statement stmt and report it to on_violation, unless max_violations have
+		been recorded already or, with distinct, this assertion was already violated on the same inputs.
+		Reaching max_violations stops exploration.
+		"""
+		self.add_violation(violation, confirmed, self.stmt_index[id(stmt)][0] if stmt is not None else None)
+
+	def add_violation(self, violation, confirmed, assertion):
+		"""
+		record_violation for the assertion with statement index assertion (as worker processes report them).
+		Returns whether the violation was recorded.
+		"""
+		if self.max_violations is not None and len(self.violations) >= self.max_violations:
+			return False
+		if self.distinct:
+			if (assertion, violation) in self.reported:
+				return False
+			self.reported.add((assertion, violation))
+		self.violations.append(violation)
+		self.confirmed.append(confirmed)
+		self.violation_keys.append(assertion)
+		if self.on_violation is not None:
+			self.on_violation(violation, confirmed)
+		if self.max_violations is not None and len(self.violations) >= self.max_violations:
+			self.exhausted = "violations"
+		return True
+
+	def check_expanded(self, path, negated):
+		"""
+		Check a negated assertion with its quantifiers expanded (see symbolic.expand_quantifiers): bounds that
+		are not constants are pinned to the one value the path allows, if any, and universal quantifiers that
+		cannot be expanded are instantiated at the path's and assertion's array indices. An instantiated query
+		that is sat is asked again with the original quantifiers, since its model may miss an instance.
+		An undecided path query makes the check unknown rather than the path infeasible.
+		"""
+		# pinning queries rarely repeat, so they skip the query cache and slicer
+		solver = base_solver(self.path_solver)
+		path_model = []
+
+		def pin(term):
+			if not path_model:
+				path_model.append(solver.check(path))
+			res, m = path_model[0]
+			if res != sat:
+				return None
+			value = m.eval(exp_to_z3(term), model_completion=True)
+			if is_int_value(value) and solver.check(path, mk('!=', term, mk('INT', value.as_long())))[0] == unsat:
+				return value.as_long()
+			return None
+
+		def candidates():
+			indices = set()
+			for exp in path + (negated,):
+				indices |= select_indices(exp, self.indices)
+			return sorted((t for t in indices if not any(s.startswith("quant_") for s in free_symbols(t, self.symbols))),
+				key=repr)
+
+		expanded, weakened = expand_quantifiers(negated, pin, self.quantifier_limit, candidates)
+		if path_model and path_model[0][0] != sat:
+			return path_model[0][0], None
+		if expanded is negated:
+			return self.path_solver.check(path, negated)
+
+		res, m = self.path_solver.check(path, expanded)
+		if weakened and res == sat:
+			return self.path_solver.check(path, negated)
+		self.stats["instantiated" if weakened else "expanded"] += 1
+		return res, m
+
+	def exec_stmt(self, stmt, state, check=True):
+		"""
+		Execute a straight-line statement, updating the state's assignments in place.
+		"""
+		# 3 types of semicolon statements: assert, array assignment, and (possibly parallel) assignment
+		if stmt[0] == 'assert':
+			if not check:
+				return
+			found = len(self.violations)
+			assertion = from_exp(stmt[1], state.assignments)
+			# an assertion that folds to true holds on every path; one that folds to false still needs a model
+			if assertion.op == 'BOOL' and assertion.args[0]:
+				self.stats["concrete"] += 1
+			elif self.check_assertion(state.path, assertion, stmt) == unknown:
+				self.stats["unknown"] += 1
+				self.unknowns.append((state.trace, f"assert {format_exp(stmt[1])} ({base_solver(self.path_solver).reason_unknown})"))
+			if self.trace:
+				self.profile.event(state.trace, "assert", format_exp(stmt[1]),
+					"violated" if len(self.violations) > found else "holds")
 
+		else:
+			assign(stmt, state.assignments, self.path_solver.define)
+
+	def is_feasible(self, path):
+		"""
+		Check whether a path condition (its guards as Terms) is satisfiable.
+		Guards that translate to constants are decided without a query; other results are cached per path.
+		"""
+		guard = exp_to_z3(path[-1])
+		if is_constant(guard):
+			return guard is True or is_true(guard)
+
+		if path not in self.feasibility_cache:
+			self.feasibility_cache[path] = self.path_solver.check(path)[0] != unsat
+		return self.feasibility_cache[path]
+
+	def mergeable(self, stmt, assignments):
+		if not self.merge_limit or stmt[0] not in ('if', 'ifelse'):
+			return False
+		size = merge_size(stmt, self.merge_sizes)
+		return size is not None and size <= self.merge_limit and not is_concrete(from_exp(stmt[1], assignments))
+
+	def exec_state(self, state, check=True):
+		"""
+		Run a state's straight-line statements up to its next if/while guard and return the successor
+		states, the guard's negation first. A loop is entered through a ['loop', while_stmt, iterations_done]
+		frame; once num_unrolls iterations are done the path is dropped if the guard still holds, and when
+		deepening, its state entering the next iteration is saved in frontier instead. With prune, a successor
+		whose path condition is unsatisfiable is cut off instead of returned.
+		Without check, assertions are skipped (used to replay a path that was already checked).
+		An if/ifelse free of loops and assertions with at most merge_limit assignments is not forked: both
+		branches run and their stores are merged at the join. Constant guards are never merged or forked: only
+		the side they select is returned, without adding the guard to the path condition or asking the solver.
+		"""
+		profile = self.profile if check else None
+		point = state.point
+		while point is not None:
+			block, idx, rest = point
+			if idx >= len(block):
+				point = rest
+				continue
+
+			stmt = block[idx]
+			point = (block, idx + 1, rest)
+			key = id(stmt[1]) if stmt[0] == 'loop' else id(stmt)
+			self.coverage[key] = self.coverage.get(key, 0) + 1
+
+			if stmt[0] not in ('if', 'ifelse', 'while', 'loop'):
+				self.exec_stmt(stmt, state, check)
+				continue
+
+			if stmt[0] == 'while':
+				stmt = ['loop', stmt, 0]
+				if profile is not None:
+					index = self.stmt_index[id(stmt[1])][0]
+					entries, iterations = profile.loops.get(index, (0, 0))
+					profile.loops[index] = (entries + 1, iterations)
+
+			elif self.mergeable(stmt, state.assignments):
+				merged = merge_if(stmt, state.assignments)
+				state.assignments = {var: self.path_solver.define(var, value) for var, value in merged.items()}
+				# a replay re-runs merges another worker has counted
+				self.stats["merged"] += 1 if check else 0
+				continue
+
+			if stmt[0] == 'loop':
+				bexp = from_exp(stmt[1][1], state.assignments)
+				# eval body unless the unroll budget is spent; the path is dropped if the guard still holds then
+				then_point = (stmt[1][2], 0, ([['loop', stmt[1], stmt[2] + 1]], 0, point))
+				if stmt[2] >= self.num_unrolls:
+					if self.frontier is not None and check and not (bexp.op == 'BOOL' and not bexp.args[0]):
+						self.frontier.append(State(then_point, dict(state.assignments),
+							state.path if is_concrete(bexp) else state.path + (bexp,), state.trace + (1,)))
+					then_point = None
+				else_point = point
 			else:
-				var = stmt[:stmt.find(":=")-1]
-				if var not in assignments:
-					assignments[var] = parse_aexp(stmt[stmt.find(":=")+3:])
+				bexp = from_exp(stmt[1], state.assignments)
+				then_point = (stmt[2], 0, point)
+				else_point = (stmt[3], 0, point) if stmt[0] == 'ifelse' else point
+
+			if check and is_concrete(bexp):
+				self.stats["concrete"] += 1
+			successors = []
+			for choice, branch_point, guard in ((0, else_point, mk('!', bexp)), (1, then_point, bexp)):
+				if branch_point is None:
+					continue
+				if guard.op == 'BOOL' and not guard.args[0]:
+					# a dead branch; reported with the branches --prune cuts off
+					self.stats["pruned"] += 1 if check and self.prune else 0
+					continue
+				if is_concrete(guard):
+					successors.append(State(branch_point, dict(state.assignments), state.path, state.trace + (choice,)))
+					continue
+				path = state.path + (guard,)
+				if check and self.prune and not self.is_feasible(path):
+					self.stats["pruned"] += 1
 				else:
-					assignments[var] = parse_aexp(stmt[stmt.find(":=")+3:], assignments, True)
-
-			program_idx_start = program_idx_start + stmt_idx_end + 2
-			parse_body(program, num_unrolls, program_idx_start, program_idx_end, name, solver, assignments, var_list)
-
-		# handle if/while
-		else:
-			# determine when the stmt ends (when the number of "end" is the same as number of "while" + "if")
-			stmt_idx_end = None
-			num_end, num_while_or_if = 0, 0
-			tmp_idx = program_idx_start
-			while tmp_idx < len(program):
-				if program[tmp_idx:].startswith("while") or program[tmp_idx:].startswith("if"):
-					num_while_or_if += 1
-				elif program[tmp_idx:].startswith("end"):
-					num_end += 1
-
-				if num_while_or_if == num_end:
-					stmt_idx_end = tmp_idx
+					successors.append(State(branch_point, dict(state.assignments), path, state.trace + (choice,)))
+
+			if profile is not None:
+				profile.counters["branches"] += 1
+				if stmt[0] == 'loop' and successors and successors[-1].trace[-1] == 1:
+					index = self.stmt_index[id(stmt[1])][0]
+					entries, iterations = profile.loops.get(index, (0, 0))
+					profile.loops[index] = (entries, iterations + 1)
+				if self.trace:
+					profile.event(state.trace, "branch", format_stmt(stmt[1] if stmt[0] == 'loop' else stmt),
+						"->", " ".join("".join(map(str, s.trace[-1:])) for s in successors) or "none")
+			return successors
+
+		self.stats["paths"] += 1
+		if self.trace and check:
+			self.profile.event(state.trace, "path end")
+		return []
+
+	def explore(self, start=None, max_steps=None, traces=None):
+		"""
+		Explore every path through the body (or below start, a State or list of States) from an explicit worklist,
+		in the order chosen by strategy. After max_steps states, or once a budget of deepen has run out, the
+		remaining worklist is returned unexplored.
+		If traces is given, the trace of the state that found each new violation is appended to it.
+		"""
+		worklist = make_worklist(self.strategy, coverage=self.coverage, key=point_key, seed=self.seed)
+		worklist.push(start if isinstance(start, list) else [start or State((self.body, 0, None), {}, ())])
+		budgeted = self.deadline is not None or self.memory_limit is not None
+		steps = 0
+		while worklist and (max_steps is None or steps < max_steps):
+			if self.exhausted or budgeted and self.out_of_budget():
+				break
+			state = worklist.pop()
+			found = len(self.violations)
+			worklist.push(self.exec_state(state))
+			if traces is not None:
+				traces.extend([state.trace] * (len(self.violations) - found))
+			steps += 1
+
+		return [worklist.pop() for _ in range(len(worklist))]
+
+	def replay(self, trace):
+		"""
+		Rebuild the state reached by following trace from the start of the body, without solver queries.
+		"""
+		state = State((self.body, 0, None), {}, ())
+		for choice in trace:
+			successors = self.exec_state(state, check=False)
+			state = next(s for s in successors if s.trace[-1] == choice)
+		return state
+
+	def explore_subtree(self, trace, max_steps=None, deadline=None):
+		"""
+		Explore the paths below trace and return the violations found (tagged with the trace of the state
+		that found them), the path statistics, the traces of the states left unexplored once max_steps
+		is reached or the deadline (a time.time() value, since it comes from another process) has passed,
+		the profile, the unknown checks and the translation_cache statistics of this subtree.
+		"""
+		self.reset()
+		translations = translation_cache.stats()
+		if deadline is not None:
+			self.deadline = time.perf_counter() + deadline - time.time()
+		self.path_solver = self.make_path_solver()
+		start = self.replay(trace)
+		replayed = dict(self.coverage)
+		traces = []
+		with self.timing_translation():
+			frontier = self.explore(start, max_steps, traces)
+		self.count_queries()
+		profile = None
+		if self.profiling:
+			self.finish_profile(replayed)
+			profile = self.profile.report()
+		if self.results is not None:
+			self.results.flush()
+		return list(zip(traces, self.violations, self.confirmed, self.violation_keys)), dict(self.stats), \
+			[state.trace for state in frontier], profile, self.unknowns, \
+			{k: v - translations[k] for k, v in translation_cache.stats().items() if k in self.worker_translations}
+
+	def explore_parallel(self):
+		"""
+		Explore the program on a pool of jobs worker processes, each with its own z3 context.
+		A worker hands back the unexplored part of its subtree after split_steps states, and those subtrees
+		are queued for any free worker, so lopsided loop-unroll trees are spread over the pool.
+		Violations are merged in depth-first order of the traces that found them, independently of timing.
+		The workers' profiles and translation_cache statistics are merged into this engine's; their parse
+		times are not counted.
+		Workers stop at the deadline themselves; once it has passed, the pool is terminated and the subtrees
+		not explored are counted in stats["unexplored"].
+		Violations are passed to on_violation (and count towards max_violations) in the order workers report them.
+		"""
+		traces = []
+		options = self.options()
+		deadline = None if self.deadline is None else time.time() + self.deadline - time.perf_counter()
+		# results and errors arrive through one queue, so the wait for either can stop at the deadline
+		outcomes = queue.SimpleQueue()
+		pool = multiprocessing.Pool(self.jobs)
+		def submit(trace):
+			pool.apply_async(_explore_subtree, (self.program, self.num_unrolls, options, trace, deadline),
+				callback=outcomes.put, error_callback=outcomes.put)
+		submit(())
+		pending = 1
+		try:
+			while pending:
+				remaining = None if self.deadline is None else max(self.deadline - time.perf_counter(), 0)
+				try:
+					done = [outcomes.get(timeout=remaining)]
+					pending -= 1
+				except queue.Empty:
+					done = []
+				if self.out_of_budget():
+					self.stats["unexplored"] += pending
+				for outcome in done:
+					if isinstance(outcome, BaseException):
+						raise outcome
+					violations, subtree_stats, frontier, profile, unknowns, translations = outcome
+					for trace, violation, confirmed, assertion in violations:
+						if self.add_violation(violation, confirmed, assertion):
+							traces.append(trace)
+					self.unknowns.extend(unknowns)
+					for k, v in subtree_stats.items():
+						self.stats[k] += v
+					for k, v in translations.items():
+						self.worker_translations[k] += v
+					if profile is not None:
+						self.profile.merge(profile)
+					if self.exhausted == "time":
+						self.stats["unexplored"] += len(frontier)
+					else:
+						for trace in frontier:
+							submit(trace)
+						pending += len(frontier)
+				if self.exhausted:
 					break
-
-				tmp_idx += 1
-
-			stmt = program[program_idx_start:stmt_idx_end+3]
-
-			bexp = stmt[3:stmt.find("then")-1] if stmt.startswith("if") else stmt[6:stmt.find("do")-1]
-
-			end_idx = program_idx_start + stmt.rfind("end") - 2
-
-			# 3 types: while, if with "else" (number of "else" matches number of "if"), and if
-			if stmt.startswith("while"):
-				bexp_before = exp_to_z3(parse_bexp(bexp))
-				bexp_after = Not(exp_to_z3(parse_bexp(bexp)))
-
-				if num_unrolls == 0:
-					# skip body
-					new_idx_start = end_idx + 6
-					solver.push()
-					solver.add(bexp_after)
-					parse_body(program, num_unrolls, new_idx_start, program_idx_end, name, solver, assignments, var_list)
-					solver.pop()
-					return
-
-				if num_unrolls != 0:
-					# skip body
-					new_idx_start = end_idx + 6
-					solver.push()
-					solver.add(bexp_after)
-					parse_body(program, num_unrolls, new_idx_start, program_idx_end, name, solver, assignments, var_list)
-					solver.pop()
-
-					last_bexp = exp_to_z3(parse_bexp(bexp, assignments, True))
-
-					solver.add(last_bexp)
-
-					# to persist the negation of the condition?
-					solver.push()
-
-					# eval body num_unrolls times
-					new_idx_start = program_idx_start + stmt.find("do") + 3
-					for i in range(num_unrolls):
-						solver.push()
-						solver.add(bexp_before)
-						parse_body(program, num_unrolls, new_idx_start, end_idx, name, solver, assignments, var_list)
-						solver.pop()
-
-						if i != num_unrolls - 1:
-							last_bexp = exp_to_z3(parse_bexp(bexp, assignments, True))
-							solver.add(last_bexp)
-
-					solver.add(bexp_after)
-					program_idx_start = end_idx + 6	
-
-
-			elif stmt.count("if") == stmt.count("else"):
-				# eval else
-				bexp = exp_to_z3(parse_bexp(bexp))
-				new_idx_start = program_idx_start + stmt.find("else") + 5
-				solver.push()
-				solver.add(Not(bexp))
-				parse_body(program, num_unrolls, new_idx_start, end_idx, name, solver, assignments, var_list)
-
-				if num_unrolls != 0:
-					# eval then
-
-					# match pop with push in eval else part
-					solver.pop()
-
-					# find index of matching else (for end_idx)
-					else_idx = None
-					num_if, num_else = 1, 0
-					tmp_idx = program_idx_start + stmt.find("then") + 5
-					while tmp_idx < program_idx_end:
-						if program[tmp_idx:].startswith("if"):
-							num_if += 1
-						elif program[tmp_idx:].startswith("else"):
-							num_else += 1
-
-						if num_else == num_if:
-							else_idx = tmp_idx
-							break
-
-						tmp_idx += 1
-					new_idx_start = program_idx_start + stmt.find("then") + 5
-					solver.add(bexp)
-					parse_body(program, num_unrolls, new_idx_start, else_idx - 1, name, solver, assignments, var_list)
-
-				program_idx_start = end_idx + 6
-
-
+		finally:
+			# workers stop at the deadline, but one may be inside a long replay or translation
+			pool.terminate()
+			pool.join()
+
+		order = sorted(range(len(traces)), key=traces.__getitem__)
+		self.violations[:] = [self.violations[i] for i in order]
+		self.confirmed[:] = [self.confirmed[i] for i in order]
+		self.violation_keys[:] = [self.violation_keys[i] for i in order]
+		self.unknowns.sort()
+		if self.profile is not None:
+			self.profile.timers["parse"] = self.parse_time
+
+
+_worker_engines = {}
+
+# options that do not change a complete result: where it is cached, and the limits of runs that, when they
+# bite, leave unknowns or time out and so are not cached
+_UNKEYED_OPTIONS = ("cache_dir", "cache_size", "query_timeout", "timeout", "portfolio")
+
+def _explore_subtree(program, num_unrolls, options, trace, deadline=None):
+	"""
+	Worker process entry point for Engine.explore_parallel. Engines are kept per program and options,
+	so a worker parses each program once.
+	"""
+	key = (program, num_unrolls, tuple(sorted(options.items())))
+	if key not in _worker_engines:
+		_worker_engines.clear()
+		_worker_engines[key] = Engine(program, num_unrolls, **dict(options, jobs=1))
+	return _worker_engines[key].explore_subtree(trace, options["split_steps"], deadline)
+
+
+def verify(program, num_unrolls, **options):
+	"""
+	Verify program text up to num_unrolls loop iterations and return the result dict of Engine.run.
+	"""
+	return Engine(program, num_unrolls, **options).run()
+
+
+def deepen(program, max_unrolls=None, time_budget=None, memory_budget=None, **options):
+	"""
+	Verify program text by iterative deepening from 0 unrolls and return the result dict of Engine.deepen.
+	"""
+	return Engine(program, 0, **options).deepen(max_unrolls, time_budget, memory_budget)
+
+
+def add_engine_arguments(arg_parser):
+	arg_parser.add_argument("--prune", action="store_true", help="cut off branches whose path condition is unsatisfiable")
+	arg_parser.add_argument("--strategy", choices=STRATEGIES, default="dfs", help="order in which paths are explored")
+	arg_parser.add_argument("--seed", type=int, help="seed for the random (random-path) strategy")
+	arg_parser.add_argument("--merge", dest="merge_limit", type=int, nargs="?", const=16, default=0, metavar="LIMIT",
+		help="merge the states of if/else branches without loops or assertions and with at most LIMIT assignments (default 16)")
+	arg_parser.add_argument("--incremental", action="store_true",
+		help="never pop the solver: give assignments SSA symbols and check paths under guard assumption literals")
+	arg_parser.add_argument("--no-query-cache", dest="query_cache", action="store_false",
+		help="send every query to z3 instead of answering repeated or subsumed ones from the query cache")
+	arg_parser.add_argument("--slice", dest="slicing", action="store_true",
+		help="split each query into slices of constraints sharing variables and solve the assertion's slice first")
+	arg_parser.add_argument("--jobs", type=int, default=1, help="number of worker processes exploring paths in parallel")
+	arg_parser.add_argument("--stats", dest="profile", action="store_true",
+		help="profile the run: phase times, solver counters, statement and loop hit counts")
+	arg_parser.add_argument("--slowest-queries", dest="slowest_queries", type=int, default=0, metavar="N",
+		help="with --stats, keep the N slowest solver queries as SMT-LIB")
+	arg_parser.add_argument("--dump-smt", dest="smt_dir", metavar="DIR",
+		help="with --stats and --slowest-queries, write the kept slowest queries to DIR")
+	arg_parser.add_argument("--trace", action="store_true",
+		help="print each branch, assertion and finished path to stderr as it is explored")
+	arg_parser.add_argument("--prepass", type=int, nargs="?", const=1000, default=0, metavar="TRIALS",
+		help="first run TRIALS random inputs (default 1000) concretely, and skip symbolic execution if one fails")
+	arg_parser.add_argument("--quantifiers", choices=QUANTIFIER_MODES, default="encode",
+		help="expand: turn bounded quantifiers in assertions into finite conjunctions/disjunctions and instantiate "
+			"the others at the array indices in the query before falling back to z3's quantifiers")
+	arg_parser.add_argument("--quantifier-limit", dest="quantifier_limit", type=int, default=64, metavar="N",
+		help="most instances a quantifier is expanded into (default 64)")
+	arg_parser.add_argument("--query-timeout", dest="query_timeout", type=float, metavar="SECONDS",
+		help="give up on a solver query after this long; the assertion is reported as unknown")
+	arg_parser.add_argument("--timeout", type=float, metavar="SECONDS",
+		help="stop exploring after this long and report the run as timed out")
+	arg_parser.add_argument("--portfolio", action="store_true",
+		help="race queries the solver cannot decide quickly on default, nonlinear-arithmetic and array-eliminating "
+			"configurations in parallel processes")
+	arg_parser.add_argument("--cache", dest="cache_dir", metavar="DIR",
+		help="keep results and assertion checks in a persistent cache in DIR, shared between runs")
+	arg_parser.add_argument("--cache-size", dest="cache_size", type=int, default=DEFAULT_SIZE, metavar="MB",
+		help=f"evict the least recently used cache entries beyond this size (default {DEFAULT_SIZE})")
+	arg_parser.add_argument("--distinct", action="store_true",
+		help="report each input that violates an assertion once, however many paths reach it")
+	arg_parser.add_argument("--max-violations", dest="max_violations", type=positive_int, metavar="N",
+		help="stop exploring once N violations are found")
+	arg_parser.add_argument("--first", dest="max_violations", action="store_const", const=1,
+		help="stop at the first violation (--max-violations 1)")
+	arg_parser.add_argument("--confirm", action="store_true",
+		help="replay each counterexample through the concrete interpreter and flag those it does not reproduce")
+
+
+def check_engine_arguments(arg_parser, args):
+	"""
+	Reject engine options that would silently do nothing.
+	"""
+	if args.smt_dir is not None and not (args.profile and args.slowest_queries > 0):
+		arg_parser.error("--dump-smt needs --stats and --slowest-queries")
+
+
+def engine_options(args):
+	return {k: getattr(args, k) for k in ("prune", "strategy", "seed", "merge_limit", "incremental", "query_cache",
+		"slicing", "jobs", "profile", "slowest_queries", "smt_dir", "trace", "prepass", "confirm", "quantifiers",
+		"quantifier_limit", "query_timeout", "timeout", "portfolio", "cache_dir", "cache_size", "distinct", "max_violations")}
+
+
+def non_negative_int(s):
+	if not s.isdigit():
+		raise argparse.ArgumentTypeError("num_unrolls must be a non-negative integer")
+	return int(s)
+
+
+def positive_int(s):
+	if not s.isdigit() or int(s) < 1:
+		raise argparse.ArgumentTypeError(f"expected a positive integer, got {s!r}")
+	return int(s)
+
+
+def _verify_file(path, num_unrolls, options):
+	"""
+	Verify one file for batch mode; errors are reported in the result instead of raised.
+	"""
+	result = {"file": path, "num_unrolls": num_unrolls}
+	try:
+		with open(path) as myFile:
+			result.update(verify(myFile.read(), num_unrolls, **options))
+	except Exception as e:
+		result["error"] = f"{type(e).__name__}: {e}"
+	return result
+
+
+def batch_main(argv):
+	arg_parser = argparse.ArgumentParser(prog="see.py batch",
+		description="Verify many programs at several unroll depths in one process and write JSON lines.")
+	arg_parser.add_argument("input_files", nargs="+")
+	arg_parser.add_argument("--unrolls", type=non_negative_int, nargs="+", required=True, metavar="N")
+	arg_parser.add_argument("--workers", type=int, default=1, help="number of files verified in parallel")
+	arg_parser.add_argument("--output", help="file to write the JSON lines to (default: stdout)")
+	add_engine_arguments(arg_parser)
+	args = arg_parser.parse_args(argv)
+	check_engine_arguments(arg_parser, args)
+
+	options = engine_options(args)
+	tasks = [(path, num_unrolls) for path in args.input_files for num_unrolls in args.unrolls]
+	out = open(args.output, "w") if args.output else sys.stdout
+	try:
+		if args.workers > 1:
+			with ProcessPoolExecutor(args.workers) as pool:
+				results = pool.map(_verify_file, *zip(*tasks), [options] * len(tasks))
+				for result in results:
+					print(json.dumps(result), file=out, flush=True)
+		else:
+			for path, num_unrolls in tasks:
+				print(json.dumps(_verify_file(path, num_unrolls, options)), file=out, flush=True)
+	finally:
+		if out is not sys.stdout:
+			out.close()
+
+
+def main(argv=None):
+	argv = sys.argv[1:] if argv is None else argv
+	if argv and argv[0] == "batch":
+		return batch_main(argv[1:])
+
+	arg_parser = argparse.ArgumentParser(prog="see.py", usage="python see.py <input_file> #num_unrolls [options]\n"
+		"       python see.py batch <input_file>... --unrolls N... [options]")
+	arg_parser.add_argument("input_file")
+	arg_parser.add_argument("num_unrolls", type=non_negative_int)
+	arg_parser.add_argument("--deepen", action="store_true",
+		help="explore 0, 1, ... up to num_unrolls unrolls, extending the previous depth's paths, until a violation is found")
+	arg_parser.add_argument("--time-budget", type=float, metavar="SECONDS", help="with --deepen, stop after this long")
+	arg_parser.add_argument("--memory-budget", type=float, metavar="MB", help="with --deepen, stop at this peak memory")
+	add_engine_arguments(arg_parser)
+	args = arg_parser.parse_args(argv)
+	check_engine_arguments(arg_parser, args)
+	if args.deepen and args.jobs > 1:
+		arg_parser.error("--deepen runs in one process and cannot use --jobs")
+	if not args.deepen and (args.time_budget is not None or args.memory_budget is not None):
+		arg_parser.error("--time-budget and --memory-budget need --deepen (use --timeout otherwise)")
+
+	# violations are printed as they are found
+	def print_violation(violation, confirmed):
+		print(violation + (" (not confirmed)" if args.confirm and not confirmed else ""), flush=True)
+
+	with open(args.input_file) as myFile:
+		if args.deepen:
+			result = deepen(myFile.read(), args.num_unrolls, args.time_budget, args.memory_budget,
+				on_violation=print_violation, **engine_options(args))
+		else:
+			result = verify(myFile.read(), args.num_unrolls, on_violation=print_violation, **engine_options(args))
+
+	gaps = []
+	if result["unknown"]:
+		count = len(result["unknown"])
+		gaps.append(f"{count} assertion check{' was' if count == 1 else 's were'} unknown")
+	if result["timed_out"]:
+		gaps.append("the run timed out before every path was explored")
+	if not result["violations"]:
+		print("No violations found" + (", but " + " and ".join(gaps) if gaps else ""))
+	elif result["timed_out"]:
+		print("Timed out before every path was explored")
+
+	for text in result["unknown"]:
+		print(f"Unknown: {text}")
+
+	if args.prune:
+		print(f"Pruned {result['stats']['pruned']} infeasible paths")
+
+	if args.deepen:
+		if result["depth"] is not None:
+			print(f"Explored all paths up to {result['depth']} unrolls")
+		if result["stopped"] in ("time", "memory"):
+			if result["depth"] is None:
+				print(f"No depth fully explored ({result['stopped']} budget exceeded)")
 			else:
-				# skip body
-				bexp = exp_to_z3(parse_bexp(bexp))
-				new_idx_start = end_idx + 6
-				solver.push()
-				solver.add(Not(bexp))
-				parse_body(program, num_unrolls, new_idx_start, program_idx_end, name, solver, assignments, var_list)
-				solver.pop()	
-
-				if num_unrolls != 0:
-					# eval body
-					solver.push()
-					solver.add(bexp)
-					new_idx_start = program_idx_start + stmt.find("then") + 5
-					parse_body(program, num_unrolls, new_idx_start, end_idx, name, solver, assignments, var_list)
-					solver.pop()
-						
-				program_idx_start = end_idx + 6
-
-			if program_idx_start < program_idx_end:
-				parse_body(program, num_unrolls, program_idx_start, program_idx_end, name, solver, assignments, var_list)
-
-	return program_idx_start
-
-
-def main():
-	if len(sys.argv) != 3 or sys.argv[0] != "see.py":
-		sys.exit("Usage: python see.py <input_file> #num_unrolls")
-
-	if not sys.argv[2].isdigit() or int(sys.argv[2]) < 0:
-		sys.exit("num_unrolls must be a non-negative integer")
+				print(f"Stopped at depth {result['depth'] + 1}: {result['stopped']} budget exceeded")
 
-	script_dir = os.path.dirname(__file__)
-	abs_file_path = os.path.join(script_dir, sys.argv[1])
-	with open(abs_file_path) as myFile:
-		program = myFile.read()
-		program = prune_whitespace(program, 1)
-
-		program_idx_start, program_idx_end, name, var_list, preconditions = parse_head(program)
-
-		solver = Solver()
-		for precondition in preconditions:
-			solver.add(exp_to_z3(precondition))
-
-		assignments = {}
-		parse_body(program, int(sys.argv[2]), program_idx_start, program_idx_end, name, solver, assignments, var_list)
-
-		if prints:
-			for violation in prints:
-				print(violation)
-		else:
-			print("No violations found")
+	if args.profile:
+		print_report(result["profile"])
 
 if __name__ == "__main__":
 	main()
@@ -1,99 +1,725 @@
-import program_parser
+from collections import OrderedDict
+from itertools import count, islice
+import multiprocessing
+from multiprocessing.connection import wait as wait_connections
+import time
+from symbolic import Term, mk, free_symbols
 from z3 import *
 
-def exp_to_z3(exp, quant_vars=None):
+class TranslationCache:
 	"""
-	Convert exp to a pySMT formula
+	Bounded LRU map from symbolic Terms to their z3 translation, plus an interned table of the
+	Int/Array constants they are built from. Terms are hash-consed, so identity is structure.
+	With timing set, the time spent in exp_to_z3 is added up in translate_time.
 	"""
 
-	if not exp:
+	def __init__(self, maxsize=100000):
+		self.maxsize = maxsize
+		self.terms = OrderedDict()
+		self.symbols = {}
+		self.hits, self.misses, self.evictions = 0, 0, 0
+		self.timing, self.translate_time = False, 0.0
+
+	def get(self, exp):
+		res = self.terms.get(exp)
+		if res is None:
+			self.misses += 1
+			return None
+		self.hits += 1
+		self.terms.move_to_end(exp)
+		return res
+
+	def put(self, exp, res):
+		self.terms[exp] = res
+		if len(self.terms) > self.maxsize:
+			self.terms.popitem(last=False)
+			self.evictions += 1
+
+	def symbol(self, name, sort):
+		key = (name, sort)
+		sym = self.symbols.get(key)
+		if sym is None:
+			sym = Int(name) if sort == 'Int' else Array(name, IntSort(), IntSort())
+			self.symbols[key] = sym
+		return sym
+
+	def clear(self):
+		self.terms.clear()
+		self.symbols.clear()
+		self.hits, self.misses, self.evictions = 0, 0, 0
+
+	def stats(self):
+		return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+			"size": len(self.terms), "symbols": len(self.symbols)}
+
+
+translation_cache = TranslationCache()
+
+def exp_to_z3(exp, cache=None):
+	"""
+	Convert a symbolic Term to a z3 formula, reusing cached translations of its subterms.
+	The DAG is walked with an explicit stack, so deep assignment chains do not hit the recursion limit.
+	"""
+
+	if exp is None:
 		return
 
-	# AEXP 
-	if exp[0] == 'INT':
-		return exp[1]
+	if cache is None:
+		cache = translation_cache
+
+	if cache.timing:
+		start = time.perf_counter()
+		res = _translate(exp, cache)
+		cache.translate_time += time.perf_counter() - start
+		return res
+	return _translate(exp, cache)
+
 
-	elif exp[0] == 'VAR':
-		if quant_vars and exp[1] in quant_vars:
-			return Int("quant_" + exp[1])
-		return Int(exp[1])
+def _translate(exp, cache):
+	done = {}
+	stack = [(exp, False)]
+	while stack:
+		term, expanded = stack.pop()
+		if term in done:
+			continue
 
-	elif exp[0] == 'ARR':
-		if len(exp) == 2:
-			return Array(exp[1], IntSort(), IntSort())
+		if not expanded:
+			res = cache.get(term)
+			if res is not None:
+				done[term] = res
+				continue
+			stack.append((term, True))
+			stack.extend((arg, False) for arg in term.args if isinstance(arg, Term) and arg not in done)
 		else:
-			# select
-			return Array(exp[1], IntSort(), IntSort())[exp_to_z3(exp[2], quant_vars)]
+			res = _term_to_z3(term.op, [done[arg] if isinstance(arg, Term) else arg for arg in term.args], cache)
+			cache.put(term, res)
+			done[term] = res
 
-	elif exp[0] == 'STORE':
-		for i in (2, 3):
-			if isinstance(exp[i], int):
-				exp[i] = Int(exp[i])
-		if not isinstance(exp[1], str):
-			return Store(exp[1], exp_to_z3(exp[2], quant_vars), exp_to_z3(exp[3], quant_vars))
-		return Store(Array(exp[1], IntSort(), IntSort()), exp_to_z3(exp[2], quant_vars), exp_to_z3(exp[3], quant_vars))
+	return done[exp]
 
-	elif exp[0] == '+':
-		return exp_to_z3(exp[1], quant_vars) + exp_to_z3(exp[2], quant_vars)
 
-	elif exp[0] == '-':
-		return exp_to_z3(exp[1], quant_vars) - exp_to_z3(exp[2], quant_vars)
+def _term_to_z3(op, args, cache):
+	"""
+	Build the z3 formula for op applied to already translated args.
+	"""
 
-	elif exp[0] == '*':
-		return exp_to_z3(exp[1], quant_vars) * exp_to_z3(exp[2], quant_vars)
+	# AEXP
+	if op in ('INT', 'BOOL'):
+		return args[0]
 
-	elif exp[0] == '/':
-		if isinstance(exp_to_z3(exp[1], quant_vars), int) and isinstance(exp_to_z3(exp[2], quant_vars), int):  
-			return exp_to_z3(exp[1], quant_vars) // exp_to_z3(exp[2], quant_vars)
-		else:
-			assert is_idiv(exp_to_z3(exp[1], quant_vars) / exp_to_z3(exp[2], quant_vars))
-			return exp_to_z3(exp[1], quant_vars) / exp_to_z3(exp[2], quant_vars)
-		
+	elif op == 'VAR':
+		return cache.symbol(args[0], 'Int')
 
-	elif exp[0] == '%':
-		return exp_to_z3(exp[1], quant_vars) % exp_to_z3(exp[2], quant_vars)
+	elif op == 'ARR':
+		return cache.symbol(args[0], 'Array')
 
+	elif op == 'SELECT':
+		return args[0][args[1]]
 
-	# BEXP
-	if exp[0] == '!':
-		return Not(exp_to_z3(exp[1]), quant_vars)
+	elif op == 'STORE':
+		return Store(args[0], args[1], args[2])
 
-	elif exp[0] == '&&':
-		return And(exp_to_z3(exp[1], quant_vars), exp_to_z3(exp[2], quant_vars))
+	if op == 'forall':
+		return ForAll([cache.symbol("quant_" + i, 'Int') for i in args[0]], args[1])
 
-	elif exp[0] == '||':
-		return Or(exp_to_z3(exp[1], quant_vars), exp_to_z3(exp[2], quant_vars))
+	elif op == 'exists':
+		return Exists([cache.symbol("quant_" + i, 'Int') for i in args[0]], args[1])
+
+	if op == '!':
+		return Not(args[0])
+
+	elif op == 'ite':
+		return If(args[0], args[1], args[2])
+
+	lhs, rhs = args
+
+	if op == '+':
+		return lhs + rhs
+
+	elif op == '-':
+		return lhs - rhs
+
+	elif op == '*':
+		return lhs * rhs
+
+	# constant operands only get here when mk left a division by 0 unfolded
+	elif op == '/':
+		if isinstance(lhs, int) and isinstance(rhs, int):
+			lhs = IntVal(lhs)
+		assert is_idiv(lhs / rhs)
+		return lhs / rhs
+
+	elif op == '%':
+		if isinstance(lhs, int) and isinstance(rhs, int):
+			lhs = IntVal(lhs)
+		return lhs % rhs
+
+
+	# BEXP
+	if op == '&&':
+		return And(lhs, rhs)
+
+	elif op == '||':
+		return Or(lhs, rhs)
 
 
 	# COMP
-	if exp[0] == '>':
-		return exp_to_z3(exp[1], quant_vars) > exp_to_z3(exp[2], quant_vars)
+	if op == '>':
+		return lhs > rhs
 
-	elif exp[0] == '<':
-		return exp_to_z3(exp[1], quant_vars) < exp_to_z3(exp[2], quant_vars)
+	elif op == '<':
+		return lhs < rhs
 
-	elif exp[0] == '>=':
-		return exp_to_z3(exp[1], quant_vars) >= exp_to_z3(exp[2], quant_vars)
+	elif op == '>=':
+		return lhs >= rhs
 
-	elif exp[0] == '<=':
-		return exp_to_z3(exp[1], quant_vars) <= exp_to_z3(exp[2], quant_vars)
+	elif op == '<=':
+		return lhs <= rhs
 
-	elif exp[0] == '=':
-		return exp_to_z3(exp[1], quant_vars) == exp_to_z3(exp[2], quant_vars)
+	elif op == '=':
+		return lhs == rhs
 
-	elif exp[0] == '!=':
-		return exp_to_z3(exp[1], quant_vars) != exp_to_z3(exp[2], quant_vars)
+	elif op == '!=':
+		return lhs != rhs
 
 	# ASSN
-	if exp[0] == '==>':
-		return Implies(exp_to_z3(exp[1], quant_vars), exp_to_z3(exp[2], quant_vars))
+	if op == '==>':
+		return Implies(lhs, rhs)
 
-	elif exp[0] == 'forall':
-		quant_vars = [i for i in exp[1]]
-		return ForAll([Int("quant_" + i) for i in exp[1]], exp_to_z3(exp[2], quant_vars))
+	raise NotImplementedError
 
-	elif exp[0] == 'exists':
-		quant_vars = [i for i in exp[1]]
-		return Exists([Int("quant_" + i) for i in exp[1]], exp_to_z3(exp[2], quant_vars))
 
-	raise NotImplementedError
+class Z3Solver:
+	"""
+	What PathSolver and IncrementalSolver share: the z3 Solver, timed checks and their limits.
+	Each check gives up after query_timeout seconds, or once the deadline (a time.perf_counter value) has
+	passed, and then returns unknown with the reason in reason_unknown. With a Portfolio, a check the local
+	solver could not decide within the portfolio's escalate_after seconds is raced by its configurations.
+	"""
+
+	def __init__(self, solver=None, cache=None):
+		self.solver = solver if solver is not None else Solver()
+		self.cache = cache
+		self.queries, self.solve_time = 0, 0.0
+		self.profile = None
+		self.query_timeout, self.deadline, self.portfolio = None, None, None
+		self.reason_unknown, self.unknowns = "", 0
+		self._timeout, self._model = None, None
+
+	def model(self):
+		return self._model if self._model is not None else self.solver.model()
+
+	def _check(self, *assumptions):
+		start = time.perf_counter()
+		res = self._solve(assumptions)
+		elapsed = time.perf_counter() - start
+		self.solve_time += elapsed
+		self.queries += 1
+		if self.profile is not None:
+			self.profile.record_query(elapsed, lambda: smt2(self.solver, assumptions))
+		return res
+
+	def _solve(self, assumptions):
+		self._model = None
+		timeout = self.query_timeout
+		if self.deadline is not None:
+			remaining = self.deadline - time.perf_counter()
+			if remaining <= 0:
+				return self._unknown("global timeout")
+			timeout = remaining if timeout is None else min(timeout, remaining)
+
+		local = timeout
+		if self.portfolio is not None:
+			local = self.portfolio.escalate_after if timeout is None else min(timeout, self.portfolio.escalate_after)
+		if local != self._timeout:
+			# z3 takes milliseconds, and 0 for no limit
+			self.solver.set("timeout", max(int(local * 1000), 1) if local is not None else 0)
+			self._timeout = local
+
+		res = self.solver.check(*assumptions)
+		if res != unknown:
+			return res
+		reason = self.solver.reason_unknown()
+		if self.portfolio is not None and reason in ("timeout", "canceled") and (timeout is None or timeout > local):
+			res, self._model, reason = self.portfolio.race(self.solver, assumptions,
+				None if timeout is None else timeout - local)
+			if res != unknown:
+				return res
+		return self._unknown(reason)
+
+	def _unknown(self, reason):
+		self.reason_unknown = reason
+		self.unknowns += 1
+		return unknown
+
+
+class PathSolver(Z3Solver):
+	"""
+	A z3 Solver whose push/pop frames mirror a path condition, one guard Term per frame.
+	sync moves the solver to another path by popping back to the common prefix and pushing the rest,
+	so consecutive states on nearby paths share most of their frames.
+	"""
+
+	def __init__(self, solver=None, cache=None):
+		super().__init__(solver, cache)
+		self.frames = []
+
+	def sync(self, path):
+		common = 0
+		for asserted, guard in zip(self.frames, path):
+			if asserted is not guard:
+				break
+			common += 1
+
+		if len(self.frames) > common:
+			self.solver.pop(len(self.frames) - common)
+			if self.profile is not None:
+				self.profile.counters["pops"] += len(self.frames) - common
+			del self.frames[common:]
+
+		if self.profile is not None:
+			self.profile.counters["pushes"] += len(path) - common
+
+		for guard in path[common:]:
+			self.solver.push()
+			self.solver.add(exp_to_z3(guard, self.cache))
+			self.frames.append(guard)
+
+	def define(self, var, value):
+		return value
+
+	def stats(self):
+		return {"queries": self.queries, "solve_time": self.solve_time, "unknowns": self.unknowns,
+			"frames": len(self.frames)}
+
+	def check(self, path, extra=None):
+		"""
+		Check path (a tuple of guard Terms) and, if given, the extra Term on top of it.
+		Returns the z3 result and the model when it is sat.
+		"""
+		self.sync(path)
+		if extra is None:
+			res = self._check()
+			return res, self.model() if res == sat else None
+
+		self.solver.push()
+		self.solver.add(exp_to_z3(extra, self.cache))
+		res = self._check()
+		model = self.model() if res == sat else None
+		self.solver.pop()
+		if self.profile is not None:
+			self.profile.counters["pushes"] += 1
+			self.profile.counters["pops"] += 1
+		return res, model
+
+
+_fresh = count()
+
+class IncrementalSolver(Z3Solver):
+	"""
+	A z3 Solver that is never popped. Every compound value assigned to a variable gets a fresh SSA
+	symbol whose defining equation is asserted once, and every guard or negated assertion Term gets a
+	Boolean literal implying it, asserted once. A path is checked with solver.check(literals), so clauses
+	learned on one query are kept for all later queries sharing the same definitions.
+	"""
+
+	def __init__(self, solver=None, cache=None):
+		super().__init__(solver, cache)
+		self.symbols = {}
+		self.literals = {}
+
+	def define(self, var, value):
+		"""
+		Return the SSA symbol Term standing for value, asserting its definition the first time.
+		"""
+		if value.op in ('INT', 'VAR', 'ARR'):
+			return value
+		symbol = self.symbols.get(value)
+		if symbol is None:
+			name = f"{var}!{next(_fresh)}"
+			symbol = mk('ARR', name) if var.startswith("ARR_") else mk('VAR', name)
+			self.solver.add(exp_to_z3(symbol, self.cache) == exp_to_z3(value, self.cache))
+			self.symbols[value] = symbol
+		return symbol
+
+	def stats(self):
+		return {"queries": self.queries, "solve_time": self.solve_time, "unknowns": self.unknowns,
+			"definitions": len(self.symbols), "literals": len(self.literals)}
+
+	def literal(self, exp):
+		lit = self.literals.get(exp)
+		if lit is None:
+			lit = Bool(f"lit!{next(_fresh)}")
+			self.solver.add(Implies(lit, exp_to_z3(exp, self.cache)))
+			self.literals[exp] = lit
+		return lit
+
+	def check(self, path, extra=None):
+		"""
+		Check path (a tuple of guard Terms) and, if given, the extra Term on top of it.
+		Returns the z3 result and the model when it is sat.
+		"""
+		assumptions = [self.literal(guard) for guard in path]
+		if extra is not None:
+			assumptions.append(self.literal(extra))
+		res = self._check(*assumptions)
+		return res, self.model() if res == sat else None
+
+
+def smt2(solver, assumptions=()):
+	"""
+	SMT-LIB text of the query solver.check(*assumptions): the solver's declarations and assertions and the check.
+	"""
+	if not assumptions:
+		return solver.sexpr() + "(check-sat)\n"
+	return solver.sexpr() + "(check-sat-assuming (" + " ".join(a.sexpr() for a in assumptions) + "))\n"
+
+
+PORTFOLIO_CONFIGS = ("default", "nla", "arrays")
+
+def portfolio_solver(config):
+	"""
+	A fresh solver for one portfolio configuration: plain z3, preprocessing for nonlinear arithmetic
+	(* / % over variables), or preprocessing that rewrites reads of array stores into if-then-else terms.
+	"""
+	if config == "default":
+		return Solver()
+	if config == "nla":
+		return Then(With('simplify', som=True), 'propagate-values', 'solve-eqs', 'purify-arith', 'smt').solver()
+	if config == "arrays":
+		return Then(With('simplify', expand_select_store=True), 'propagate-values', 'elim-uncnstr', 'smt').solver()
+	raise ValueError(f"unknown portfolio configuration {config!r}")
+
+
+def _race_worker(config, text, timeout, conn):
+	"""
+	Portfolio process: solve the SMT-LIB query text with one configuration and send back the result,
+	the model's constants as SMT-LIB values when it is sat, and the reason when it is unknown.
+	"""
+	solver = portfolio_solver(config)
+	if timeout is not None:
+		solver.set("timeout", max(int(timeout * 1000), 1))
+	solver.from_string(text)
+	res = solver.check()
+	values = []
+	if res == sat:
+		m = solver.model()
+		values = [(d.name(), m.eval(d(), model_completion=True).sexpr()) for d in m.decls() if d.arity() == 0]
+	conn.send((str(res), values, solver.reason_unknown() if res == unknown else ""))
+
+
+class Portfolio:
+	"""
+	Races the configurations on a query in one process each and takes the first sat or unsat answer;
+	the others are terminated. Only queries the local solver could not decide within escalate_after
+	seconds get here, so the cost of starting processes is paid on the slow tail only.
+	A sat answer's model is rebuilt locally by checking the query with the winner's values fixed.
+	"""
+
+	def __init__(self, configs=PORTFOLIO_CONFIGS, escalate_after=0.5):
+		for config in configs:
+			portfolio_solver(config)
+		self.configs = configs
+		self.escalate_after = escalate_after
+		self.wins = dict.fromkeys(configs, 0)
+
+	def race(self, solver, assumptions, timeout):
+		"""
+		Returns the result, the model when it is sat, and the reason when it is unknown.
+		"""
+		text = solver.sexpr() + "".join(f"(assert {a.sexpr()})\n" for a in assumptions)
+		context = multiprocessing.get_context()
+		running = {}
+		for config in self.configs:
+			receiver, sender = context.Pipe(duplex=False)
+			process = context.Process(target=_race_worker, args=(config, text, timeout, sender), daemon=True)
+			process.start()
+			sender.close()
+			running[receiver] = (config, process)
+
+		deadline = time.perf_counter() + timeout if timeout is not None else None
+		reasons = []
+		try:
+			while running:
+				remaining = None if deadline is None else deadline - time.perf_counter()
+				ready = wait_connections(list(running), remaining if remaining is None else max(remaining, 0))
+				if not ready:
+					reasons.append("timeout")
+					break
+				for receiver in ready:
+					config, process = running.pop(receiver)
+					try:
+						res, values, reason = receiver.recv()
+					except EOFError:
+						res, values, reason = "unknown", [], "crashed"
+					if res == "unsat":
+						self.wins[config] += 1
+						return unsat, None, ""
+					if res == "sat":
+						model = self.rebuild_model(solver, assumptions, values)
+						if model is not None:
+							self.wins[config] += 1
+							return sat, model, ""
+						reason = "model could not be rebuilt"
+					reasons.append(f"{config}: {reason}")
+		finally:
+			for receiver, (config, process) in running.items():
+				process.terminate()
+				process.join()
+				receiver.close()
+		return unknown, None, "portfolio: " + ", ".join(reasons)
+
+	def rebuild_model(self, solver, assumptions, values):
+		declarations = "".join(line + "\n" for line in solver.sexpr().splitlines() if line.startswith("(declare-"))
+		try:
+			fixed = parse_smt2_string(declarations + "".join(f"(assert (= {name} {value}))" for name, value in values))
+		except Z3Exception:
+			return None
+		solver.push()
+		solver.add(fixed)
+		model = solver.model() if solver.check(*assumptions) == sat else None
+		solver.pop()
+		return model
+
+
+class QueryCache:
+	"""
+	Caches query results in front of a PathSolver or IncrementalSolver, with the same interface.
+	A query is keyed by the set of its constraint Terms (guards and the extra Term), ignoring order,
+	repeats and constant-true guards. Before asking z3 it tries, in order: an exact hit, a cached unsat
+	query whose constraints are a subset (so this one is unsat too), a cached sat query whose constraints
+	are a superset (its model satisfies this one too), and the most recent models, evaluated directly
+	against the constraints and base (the formulas every model must satisfy, e.g. the preconditions).
+	Each model evaluates base once and each constraint Term once, as queries share most of their guards.
+	Without base, models are not re-evaluated, e.g. when SSA symbols hide the meaning of the guards.
+	"""
+
+	def __init__(self, path_solver, base=None, maxsize=4096, scan=32, recent_models=8):
+		self.path_solver = path_solver
+		self.cache = path_solver.cache
+		self.base = base
+		self.maxsize = maxsize
+		self.scan = scan
+		self.results = OrderedDict()
+		self.unsat_keys = OrderedDict()
+		self.sat_keys = OrderedDict()
+		self.constants = {}
+		self.models = []
+		self.recent_models = recent_models
+		self.counts = {"hits": 0, "unsat_subset": 0, "sat_superset": 0, "model_reuse": 0, "misses": 0}
+
+	def define(self, var, value):
+		return self.path_solver.define(var, value)
+
+	def check(self, path, extra=None):
+		constraints = set()
+		for exp in path + ((extra,) if extra is not None else ()):
+			value = self._constant(exp)
+			if value is False:
+				self.counts["hits"] += 1
+				return unsat, None
+			if value is None:
+				constraints.add(exp)
+		key = frozenset(constraints)
+
+		if key in self.results:
+			self.counts["hits"] += 1
+			self.results.move_to_end(key)
+			return self.results[key]
+
+		# subsumption is only looked for among the most recent queries, which share the most constraints
+		for unsat_key in islice(reversed(self.unsat_keys), self.scan):
+			if unsat_key <= key:
+				self.counts["unsat_subset"] += 1
+				return self._store(key, (unsat, None))
+
+		for sat_key, model in islice(reversed(self.sat_keys.items()), self.scan):
+			if key <= sat_key:
+				self.counts["sat_superset"] += 1
+				return self._store(key, (sat, model))
+
+		if self.base is not None:
+			for model, values in reversed(self.models):
+				if self._satisfies(model, values, key):
+					self.counts["model_reuse"] += 1
+					return self._store(key, (sat, model))
+
+		self.counts["misses"] += 1
+		res, model = self.path_solver.check(path, extra)
+		if res == unknown:
+			# a later query may be given more time
+			return res, model
+		if res == sat and self.base is not None and self._holds(model, self.base):
+			self.models.append((model, {}))
+			del self.models[:-self.recent_models]
+		return self._store(key, (res, model))
+
+	def _constant(self, exp):
+		"""
+		True or False if exp translates to a constant, None otherwise.
+		"""
+		if exp not in self.constants:
+			z3_exp = exp_to_z3(exp, self.cache)
+			if isinstance(z3_exp, bool):
+				self.constants[exp] = z3_exp
+			else:
+				self.constants[exp] = True if is_true(z3_exp) else False if is_false(z3_exp) else None
+		return self.constants[exp]
+
+	def _satisfies(self, model, values, key):
+		"""
+		Whether model satisfies every constraint in key, memoising its value for each Term in values.
+		"""
+		for exp in key:
+			if exp not in values:
+				values[exp] = self._holds(model, (exp_to_z3(exp, self.cache),))
+			if not values[exp]:
+				return False
+		return True
+
+	@staticmethod
+	def _holds(model, exps):
+		return all(exp if isinstance(exp, bool) else is_true(model.eval(exp, model_completion=True)) for exp in exps)
+
+	def _store(self, key, result):
+		self.results[key] = result
+		if len(self.results) > self.maxsize:
+			self.results.popitem(last=False)
+		for res, keys in ((unsat, self.unsat_keys), (sat, self.sat_keys)):
+			if result[0] == res:
+				keys[key] = result[1]
+				if len(keys) > self.maxsize:
+					keys.popitem(last=False)
+		return result
+
+	def stats(self):
+		queries = sum(self.counts.values())
+		stats = dict(self.counts)
+		stats["hit_rate"] = (queries - self.counts["misses"]) / queries if queries else 0.0
+		return stats
+
+
+class MergedModel:
+	"""
+	The union of the models of independent constraint slices, read like a z3 model by check_assertion.
+	Each slice's model supplies the values of the variables it owns; the first model fills in the rest,
+	and gives the variables no slice mentions arbitrary values under model_completion.
+	"""
+
+	def __init__(self, models):
+		self.first = models[0][0]
+		self.values = {}
+		self.by_name = {}
+		for m, owned in models:
+			for d in m.decls():
+				if d.name() in owned:
+					self.values[d.name()], self.by_name[d.name()] = m[d], d
+		for d in models[0][0].decls():
+			if d.name() not in self.values:
+				self.values[d.name()], self.by_name[d.name()] = models[0][0][d], d
+
+	def decls(self):
+		return list(self.by_name.values())
+
+	def __getitem__(self, d):
+		return self.values[d.name()]
+
+	def eval(self, exp, model_completion=False):
+		"""
+		The value of a variable (exp is a z3 constant), as z3's ModelRef.eval.
+		"""
+		value = self.values.get(exp.decl().name())
+		return value if value is not None else self.first.eval(exp, model_completion)
+
+
+class Slicer:
+	"""
+	Splits each query into independent slices before it reaches the solver (usually a QueryCache):
+	constraints are grouped by shared variables, with the preconditions' variables tied together.
+	The slice containing the extra Term (or the last guard) is checked first, so an unsat assertion query
+	only ever sends its own slice to z3; the other slices recur across queries and are mostly answered
+	by the cache. A sat result carries the union of the slices' models, with each variable's value taken
+	from the slice it belongs to.
+	"""
+
+	def __init__(self, path_solver, base_terms=()):
+		self.path_solver = path_solver
+		self.cache = path_solver.cache
+		self.symbols = {}
+		self.base_groups = [free_symbols(term, self.symbols) for term in base_terms]
+		self.counts = {"queries": 0, "slices": 0}
+
+	def define(self, var, value):
+		return self.path_solver.define(var, value)
+
+	def check(self, path, extra=None):
+		self.counts["queries"] += 1
+		constraints = path + ((extra,) if extra is not None else ())
+		if not constraints:
+			return self.path_solver.check(path, extra)
+
+		parent = {}
+		def find(v):
+			while parent.setdefault(v, v) != v:
+				parent[v] = parent[parent[v]]
+				v = parent[v]
+			return v
+
+		def union(names):
+			roots = [find(v) for v in names]
+			for root in roots[1:]:
+				parent[root] = roots[0]
+			return roots[0] if roots else None
+
+		for group in self.base_groups:
+			union(group)
+		roots = [union(free_symbols(exp, self.symbols)) for exp in constraints]
+
+		slices = {}
+		for exp, root in zip(constraints, roots):
+			slices.setdefault(find(root) if root is not None else None, []).append(exp)
+		target = find(roots[-1]) if roots[-1] is not None else None
+		order = [target] + [root for root in slices if root != target]
+		self.counts["slices"] += len(slices)
+
+		owned = {}
+		for v in parent:
+			owned.setdefault(find(v), set()).add(v)
+
+		models = []
+		for root in order:
+			exps = slices[root]
+			if extra is not None and exps[-1] is extra:
+				res, model = self.path_solver.check(tuple(exps[:-1]), extra)
+			else:
+				res, model = self.path_solver.check(tuple(exps))
+			if res != sat:
+				return res, None
+			models.append((model, owned.get(root, set())))
+
+		if len(models) == 1:
+			return sat, models[0][0]
+		return sat, MergedModel(models)
+
+	def stats(self):
+		return dict(self.counts)
+
+
+def base_solver(path_solver):
+	"""
+	The Z3Solver (PathSolver or IncrementalSolver) at the bottom of a stack of QueryCache/Slicer layers.
+	"""
+	while hasattr(path_solver, "path_solver"):
+		path_solver = path_solver.path_solver
+	return path_solver
+
+
+def solver_stats(path_solver):
+	"""
+	Statistics of every layer of a (possibly wrapped) path solver, keyed by layer class name.
+	"""
+	stats = {}
+	while path_solver is not None:
+		stats[type(path_solver).__name__] = path_solver.stats()
+		path_solver = getattr(path_solver, "path_solver", None)
+	return stats
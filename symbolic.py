@@ -0,0 +1,462 @@
+"""
+Hash-consed symbolic expressions used for the symbolic store and for translation to z3.
+Every Term is interned: building a node whose operation and arguments match a live node returns that
+node, so identical subterms are stored once and structural equality is identity.
+Operations mirror program_parser's tree form:
+"INT" (args: the integer), "BOOL" (args: True or False), "VAR" (args: the variable name),
+"ARR" (args: the array name) for an array symbol, "SELECT" (args: array term, index term),
+"STORE" (args: array term, index term, value term), arithmetic/boolean/comparison operators with their
+operand terms, "ite" (args: condition, then term, else term) for values joined after an if/else,
+and "forall"/"exists" (args: tuple of bound names, body term).
+mk folds operations on constants as it builds them, so an expression over concrete values is an INT or
+BOOL Term and can be decided without the solver. Division and remainder follow SMT-LIB (the remainder is
+never negative) and are left alone when the divisor is 0.
+Array writes are kept compact the same way: a STORE chain holds one write per index, its writes to concrete
+indices are ordered by index (so equal contents give the same Term), a write of the value already there
+disappears, and a read resolves to the written value when it meets a write to the same index, looking past
+writes to provably distinct indices. Only a write to an index that is not provably distinct from the others
+stays in the chain as a barrier.
+"""
+
+import hashlib
+import weakref
+from itertools import product
+
+_interned = weakref.WeakValueDictionary()
+
+class Term:
+	__slots__ = ('op', 'args', '__weakref__')
+
+	def __init__(self, op, args):
+		self.op = op
+		self.args = args
+
+	def __repr__(self):
+		return "[" + ", ".join([repr(self.op)] + [repr(a) for a in self.args]) + "]"
+
+
+def mk(op, *args):
+	"""
+	Return the unique Term for op applied to args, or the constant it folds to.
+	"""
+	if op in _FOLDS:
+		folded = _FOLDS[op](*args)
+		if folded is not None:
+			return folded
+	return _intern(op, args)
+
+
+def _intern(op, args):
+	key = (op, args)
+	term = _interned.get(key)
+	if term is None:
+		term = Term(op, args)
+		_interned[key] = term
+	return term
+
+
+def smt_div(a, b):
+	return (a - smt_mod(a, b)) // b
+
+
+def smt_mod(a, b):
+	return a % abs(b)
+
+
+def _arith(fn, nonzero=False):
+	def fold(lhs, rhs):
+		if lhs.op == 'INT' and rhs.op == 'INT' and not (nonzero and rhs.args[0] == 0):
+			return mk('INT', fn(lhs.args[0], rhs.args[0]))
+	return fold
+
+
+def _compare(fn, reflexive):
+	def fold(lhs, rhs):
+		if lhs is rhs:
+			return mk('BOOL', reflexive)
+		if lhs.op == 'INT' and rhs.op == 'INT':
+			return mk('BOOL', fn(lhs.args[0], rhs.args[0]))
+	return fold
+
+
+def _fold_not(exp):
+	if exp.op == 'BOOL':
+		return mk('BOOL', not exp.args[0])
+
+
+def _fold_and(lhs, rhs):
+	for a, b in ((lhs, rhs), (rhs, lhs)):
+		if a.op == 'BOOL':
+			return b if a.args[0] else a
+
+
+def _fold_or(lhs, rhs):
+	for a, b in ((lhs, rhs), (rhs, lhs)):
+		if a.op == 'BOOL':
+			return a if a.args[0] else b
+
+
+def _fold_implies(lhs, rhs):
+	if lhs.op == 'BOOL':
+		return rhs if lhs.args[0] else mk('BOOL', True)
+	if rhs.op == 'BOOL' and rhs.args[0]:
+		return rhs
+
+
+def _fold_ite(cond, then, other):
+	if cond.op == 'BOOL':
+		return then if cond.args[0] else other
+	if then is other:
+		return then
+
+
+def _fold_quantifier(names, body):
+	if body.op == 'BOOL':
+		return body
+
+
+def _offset(index):
+	"""
+	Split an index Term into (base Term or None, integer offset).
+	"""
+	if index.op == 'INT':
+		return None, index.args[0]
+	if index.op in ('+', '-') and index.args[1].op == 'INT':
+		return index.args[0], index.args[1].args[0] if index.op == '+' else -index.args[1].args[0]
+	if index.op == '+' and index.args[0].op == 'INT':
+		return index.args[1], index.args[0].args[0]
+	return index, 0
+
+
+def distinct(i, j):
+	"""
+	Whether index Terms i and j differ in every state: two different constants, or the same base plus
+	different constant offsets (as a[i] and a[i+1]).
+	"""
+	(base_i, offset_i), (base_j, offset_j) = _offset(i), _offset(j)
+	return base_i is base_j and offset_i != offset_j
+
+
+def _written(arr, index):
+	"""
+	Whether the STORE chain arr writes index above its first write to an index not provably distinct from it.
+	"""
+	while arr.op == 'STORE':
+		if arr.args[1] is index:
+			return True
+		if not distinct(arr.args[1], index):
+			return False
+		arr = arr.args[0]
+	return False
+
+
+def _sinks_below(top, index, inner):
+	"""
+	Whether a write to index goes below the write to top (over the chain inner): when that keeps concrete
+	indices in order, or reaches an older write to index.
+	"""
+	if index.op == 'INT' and top.op == 'INT':
+		# a run of concrete writes is ordered, so there is no older write to index below a smaller top
+		return top.args[0] > index.args[0]
+	return distinct(top, index) and _written(inner, index)
+
+
+def _fold_store(arr, index, value):
+	if value.op == 'SELECT' and value.args[1] is index and mk('SELECT', arr, index) is value:
+		return arr
+	# walk down (without recursing, chains can be thousands of writes long) to where the write belongs,
+	# dropping an older write to index, then put the writes walked past back on top in order
+	above, source = [], arr
+	while source.op == 'STORE':
+		inner, top, _ = source.args
+		if top is index:
+			source = inner
+			break
+		if not _sinks_below(top, index, inner):
+			break
+		above.append(source)
+		source = inner
+	if source is arr:
+		return None
+	result = _intern('STORE', (source, index, value))
+	for write in reversed(above):
+		result = _intern('STORE', (result,) + write.args[1:])
+	return result
+
+
+def _fold_select(arr, index):
+	source = arr
+	while source.op == 'STORE':
+		if source.args[1] is index:
+			return source.args[2]
+		if not distinct(source.args[1], index):
+			break
+		source = source.args[0]
+	if source is not arr:
+		return mk('SELECT', source, index)
+
+
+_FOLDS = {'+': _arith(lambda a, b: a + b), '-': _arith(lambda a, b: a - b), '*': _arith(lambda a, b: a * b),
+	'/': _arith(smt_div, True), '%': _arith(smt_mod, True),
+	'<': _compare(lambda a, b: a < b, False), '>': _compare(lambda a, b: a > b, False),
+	'<=': _compare(lambda a, b: a <= b, True), '>=': _compare(lambda a, b: a >= b, True),
+	'=': _compare(lambda a, b: a == b, True), '!=': _compare(lambda a, b: a != b, False),
+	'!': _fold_not, '&&': _fold_and, '||': _fold_or, '==>': _fold_implies, 'ite': _fold_ite,
+	'forall': _fold_quantifier, 'exists': _fold_quantifier, 'STORE': _fold_store, 'SELECT': _fold_select}
+
+
+def is_concrete(exp):
+	"""
+	Whether exp is a constant Term (INT or BOOL), i.e. needs no solver to evaluate.
+	"""
+	return exp.op in ('INT', 'BOOL')
+
+
+def num_terms():
+	"""
+	The number of distinct Terms alive in this process (reported by --stats).
+	"""
+	return len(_interned)
+
+
+def from_exp(exp, assignments=None, bound=()):
+	"""
+	Build the Term for a parsed expression, replacing program variables with their symbolic values
+	from assignments. Variables bound by a quantifier are renamed to their quant_ symbol instead.
+	The tree is walked with an explicit stack, so long generated assertions do not hit the recursion limit.
+	"""
+	results = []
+	stack = [(exp, tuple(bound), False)]
+	while stack:
+		e, names, expanded = stack.pop()
+		op = e[0]
+		if op == 'INT':
+			results.append(mk('INT', e[1]))
+		elif op == 'VAR':
+			if e[1] in names:
+				results.append(mk('VAR', "quant_" + e[1]))
+			elif assignments and e[1] in assignments:
+				results.append(assignments[e[1]])
+			else:
+				results.append(mk('VAR', e[1]))
+		elif op == 'ARR' and len(e) == 2:
+			results.append(_array(e[1], assignments))
+		elif not expanded:
+			stack.append((e, names, True))
+			if op in ('forall', 'exists'):
+				stack.append((e[2], names + tuple(e[1]), False))
+			else:
+				stack.extend((child, names, False) for child in reversed(e[2:] if op == 'ARR' else e[1:]))
+		elif op == 'ARR':
+			results.append(mk('SELECT', _array(e[1], assignments), results.pop()))
+		elif op in ('forall', 'exists'):
+			results.append(mk(op, tuple(e[1]), results.pop()))
+		else:
+			args = results[len(results) - (len(e) - 1):]
+			del results[len(results) - (len(e) - 1):]
+			results.append(mk(op, *args))
+
+	return results[0]
+
+
+def _array(name, assignments):
+	arr = assignments.get(name) if assignments else None
+	return mk('ARR', name) if arr is None else arr
+
+
+def free_symbols(exp, memo):
+	"""
+	Names of the variables and arrays occurring free in exp. memo maps already visited Terms to
+	their symbols and is filled in along the way.
+	"""
+	stack = [(exp, False)]
+	while stack:
+		term, expanded = stack.pop()
+		if term in memo:
+			continue
+
+		children = [arg for arg in term.args if isinstance(arg, Term)]
+		if not expanded:
+			stack.append((term, True))
+			stack.extend((arg, False) for arg in children if arg not in memo)
+		elif term.op in ('VAR', 'ARR'):
+			memo[term] = frozenset(term.args)
+		elif term.op in ('forall', 'exists'):
+			memo[term] = memo[term.args[1]] - {"quant_" + v for v in term.args[0]}
+		else:
+			memo[term] = frozenset().union(*[memo[arg] for arg in children])
+
+	return memo[exp]
+
+
+def term_digest(exp, memo):
+	"""
+	A hash of the content of exp that is the same in every process, unlike the Term's identity. memo maps
+	already visited Terms to their digests and is filled in along the way.
+	"""
+	stack = [(exp, False)]
+	while stack:
+		term, expanded = stack.pop()
+		if term in memo:
+			continue
+
+		children = [arg for arg in term.args if isinstance(arg, Term)]
+		if not expanded:
+			stack.append((term, True))
+			stack.extend((arg, False) for arg in children if arg not in memo)
+		else:
+			content = repr([term.op] + [memo[arg] if isinstance(arg, Term) else arg for arg in term.args])
+			memo[term] = hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+	return memo[exp]
+
+
+def substitute(exp, mapping):
+	"""
+	Replace the subterms of exp that are keys of mapping by their values. Quantifiers binding a replaced
+	VAR are left alone below it.
+	"""
+	done = dict(mapping)
+	stack = [(exp, False)]
+	while stack:
+		term, expanded = stack.pop()
+		if term in done:
+			continue
+
+		children = [arg for arg in term.args if isinstance(arg, Term)]
+		if term.op in ('forall', 'exists'):
+			inner = {k: v for k, v in mapping.items() if k.op != 'VAR' or k.args[0][len("quant_"):] not in term.args[0]}
+			done[term] = mk(term.op, term.args[0], substitute(term.args[1], inner)) if inner else term
+		elif not expanded:
+			stack.append((term, True))
+			stack.extend((arg, False) for arg in children if arg not in done)
+		else:
+			done[term] = mk(term.op, *[done[arg] if isinstance(arg, Term) else arg for arg in term.args])
+
+	return done[exp]
+
+
+_FLIP = {'<': '>', '>': '<', '<=': '>=', '>=': '<=', '=': '='}
+
+def quantifier_ranges(exp, value_of, limit):
+	"""
+	The integer range of each variable bound by the forall/exists Term exp, derived from the comparisons
+	conjoined in its antecedent (forall) or body (exists), or None if some variable is not confined to a
+	range or the ranges hold more than limit combinations. value_of maps a Term free of bound variables to
+	its integer value, or None if it is not fixed.
+	"""
+	names, body = exp.args
+	bound = {mk('VAR', "quant_" + name): name for name in names}
+	conjuncts = []
+	_conjuncts(body.args[0] if exp.op == 'forall' and body.op == '==>' else body if exp.op == 'exists' else None,
+		conjuncts)
+
+	low, high = dict.fromkeys(names), dict.fromkeys(names)
+	values, symbols = {}, {}
+	for _ in range(len(names) + 1):
+		for c in conjuncts:
+			for op, var, other in ((c.op, c.args[0], c.args[1]), (_FLIP[c.op], c.args[1], c.args[0])):
+				if var not in bound:
+					continue
+				if other in bound:
+					lo, hi = low[bound[other]], high[bound[other]]
+				else:
+					if other not in values:
+						free = any(s.startswith("quant_") for s in free_symbols(other, symbols))
+						values[other] = None if free else other.args[0] if other.op == 'INT' else value_of(other)
+					lo = hi = values[other]
+				name = bound[var]
+				if op in ('>', '>=', '=') and lo is not None:
+					lo += op == '>'
+					low[name] = lo if low[name] is None else max(low[name], lo)
+				if op in ('<', '<=', '=') and hi is not None:
+					hi -= op == '<'
+					high[name] = hi if high[name] is None else min(high[name], hi)
+
+	size = 1
+	for name in names:
+		if low[name] is None or high[name] is None:
+			return None
+		size *= max(high[name] - low[name] + 1, 0)
+	if size > limit:
+		return None
+	return [range(low[name], high[name] + 1) for name in names]
+
+
+def _conjuncts(exp, out):
+	if exp is None:
+		return
+	if exp.op == '&&':
+		_conjuncts(exp.args[0], out)
+		_conjuncts(exp.args[1], out)
+	elif exp.op in _FLIP:
+		out.append(exp)
+
+
+def select_indices(exp, memo):
+	"""
+	The index Terms of the array reads in exp. memo maps already visited Terms to their indices.
+	"""
+	stack = [(exp, False)]
+	while stack:
+		term, expanded = stack.pop()
+		if term in memo:
+			continue
+
+		children = [arg for arg in term.args if isinstance(arg, Term)]
+		if not expanded:
+			stack.append((term, True))
+			stack.extend((arg, False) for arg in children if arg not in memo)
+		else:
+			indices = frozenset().union(*[memo[arg] for arg in children])
+			memo[term] = indices | {term.args[1]} if term.op == 'SELECT' else indices
+
+	return memo[exp]
+
+
+def expand_quantifiers(exp, value_of, limit, candidates=None):
+	"""
+	Rewrite the quantifiers in the boolean structure of exp without z3 quantifiers where possible:
+	one whose variables range over at most limit combinations (see quantifier_ranges) becomes the finite
+	conjunction (forall) or disjunction (exists) of its instances, which is equivalent. Otherwise, a
+	quantifier in universal position (a forall, or a negated exists) is replaced by its instances at the
+	Terms returned by candidates() (called at most once), up to limit of them, which only weakens exp: an
+	unsat answer for the result holds for exp, a sat one does not. Other quantifiers are kept.
+	Returns the rewritten Term and whether it was weakened.
+	"""
+	weakened = False
+	instances = []
+
+	def walk(term, positive):
+		nonlocal weakened
+		if term.op in ('&&', '||'):
+			return mk(term.op, walk(term.args[0], positive), walk(term.args[1], positive))
+		if term.op == '!':
+			return mk('!', walk(term.args[0], not positive))
+		if term.op == '==>':
+			return mk('==>', walk(term.args[0], not positive), walk(term.args[1], positive))
+		if term.op not in ('forall', 'exists'):
+			return term
+
+		names, body = term.args
+		ranges = quantifier_ranges(term, value_of, limit)
+		if ranges is None:
+			universal = (term.op == 'forall') == positive
+			if universal and candidates and not instances:
+				instances.append(candidates())
+			if not universal or not instances or not instances[0]:
+				return term
+			ranges = [instances[0]] * len(names)
+			weakened = True
+
+		join = '&&' if term.op == 'forall' else '||'
+		result = mk('BOOL', term.op == 'forall')
+		for count, values in enumerate(product(*ranges)):
+			if count == limit:
+				break
+			instance = substitute(body, {mk('VAR', "quant_" + name): value if isinstance(value, Term) else mk('INT', value)
+				for name, value in zip(names, values)})
+			result = mk(join, result, walk(instance, positive))
+		return result
+
+	return walk(exp, True), weakened
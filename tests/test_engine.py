@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from see import verify, deepen
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+DROP = """program drop(x y)
+is
+	x := 0;
+	assert x + y > 100;
+end
+"""
+
+
+def test_violation_prints_every_input():
+	# x is overwritten before the assertion, so the model does not mention it
+	for options in ({}, {"slicing": True}, {"incremental": True}, {"quantifiers": "expand"}, {"prepass": 100}):
+		violations = verify(DROP, 0, **options)["violations"]
+		assert len(violations) == 1 and len(violations[0].split()) == 3, options
+	with open(os.path.join(HERE, "min_invalid.imp")) as f:
+		violations = verify(f.read(), 1, quantifiers="expand")["violations"]
+	assert all(violation.count("K(Int") == 1 for violation in violations)
+
+
+def test_max_violations_must_be_positive():
+	for n in (0, -1):
+		with pytest.raises(ValueError):
+			verify(DROP, 0, max_violations=n)
+	assert len(verify(DROP, 0, max_violations=1)["violations"]) == 1
+
+
+def test_deepen_uses_prepass_and_result_cache(tmp_path):
+	with open(os.path.join(HERE, "min_invalid.imp")) as f:
+		source = f.read()
+	result = deepen(source, 3, prepass=100, seed=1)
+	assert result["stopped"] == "violation" and result["stats"]["prepass"] and not result["stats"]["paths"]
+	first, second = deepen(source, 3, cache_dir=str(tmp_path)), deepen(source, 3, cache_dir=str(tmp_path))
+	assert second.get("cached") and second["violations"] == first["violations"]
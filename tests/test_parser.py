@@ -0,0 +1,85 @@
+import pytest
+
+from program_parser import *
+
+
+def test_prune_whitespace():
+    assert(prune_whitespace("     \ta      b   c     d\n  e  ")) == "abcde"
+    assert(prune_whitespace("     \ta      b   c     d\n  e  ", 1)) == " a b c d e "
+    assert(prune_whitespace("     \ta      b   c     d\n  e  ", 2)) == "  a  b  c  d  e  "
+    assert(prune_whitespace("some\n \twords", 1)) == "some words"
+
+
+def test_tokenize():
+    assert tokenize("a[i]<=-10 ==> n % f == 0") == [("NAME", "a"), ("OP", "["), ("NAME", "i"), ("OP", "]"), ("OP", "<="), ("OP", "-"), ("INT", 10), ("OP", "==>"), ("NAME", "n"), ("OP", "%"), ("NAME", "f="), ("OP", "="), ("INT", 0)]
+
+
+def test_parse_aexp():
+    assert parse_aexp("x+2*3%4") == ['+', ['VAR', 'x'], ['%', ['*', ['INT', 2], ['INT', 3]], ['INT', 4]]]
+    assert parse_aexp("(5+6)*(4+2)%((7+8)/(5+6))") == ['%', ['*', ['+', ['INT', 5], ['INT', 6]], ['+', ['INT', 4], ['INT', 2]]], ['/', ['+', ['INT', 7], ['INT', 8]], ['+', ['INT', 5], ['INT', 6]]]]
+    assert parse_aexp("arr[x+2*3%4]") == ["ARR", "ARR_arr", parse_aexp("x+2*3%4")]
+    assert parse_aexp("-x*y+z") == ['+', ['-', ['INT', 0], ['*', ['VAR', 'x'], ['VAR', 'y']]], ['VAR', 'z']]
+    assert parse_aexp("2*-3") == ['*', ['INT', 2], ['-', ['INT', 0], ['INT', 3]]]
+
+
+def test_parse_comp():
+    assert parse_comp("x>=5") == ['>=', ['VAR', 'x'], ['INT', 5]]
+    assert parse_comp("x<=5") == ['<=', ['VAR', 'x'], ['INT', 5]]
+    assert parse_comp("x!=5") == ['!=', ['VAR', 'x'], ['INT', 5]]
+    assert parse_comp("x=5") == ['=', ['VAR', 'x'], ['INT', 5]]
+    assert parse_comp("(x+1) > (y)") == ['>', ['+', ['VAR', 'x'], ['INT', 1]], ['VAR', 'y']]
+
+
+def test_parse_bexp():
+    assert parse_bexp("x>2 && y<4 || z=6") == ['||', ['&&', ['>', ['VAR', 'x'], ['INT', 2]], ['<', ['VAR', 'y'], ['INT', 4]]], ['=', ['VAR', 'z'], ['INT', 6]]]
+    assert parse_bexp("x>2||y<4&&z=6") == ['||', ['>', ['VAR', 'x'], ['INT', 2]], ['&&', ['<', ['VAR', 'y'], ['INT', 4]], ['=', ['VAR', 'z'], ['INT', 6]]]]
+    assert parse_bexp("(x>2||x<2)&&!(y>2||y<2)") == ['&&', ['||', ['>', ['VAR', 'x'], ['INT', 2]], ['<', ['VAR', 'x'], ['INT', 2]]], ['!', ['||', ['>', ['VAR', 'y'], ['INT', 2]], ['<', ['VAR', 'y'], ['INT', 2]]]]]
+    assert parse_bexp("  forall i  j k, j>i && exists l, k<=l || k>l") == ['forall', ['i', 'j', 'k'], ['&&', ['>', ['VAR', 'j'], ['VAR', 'i']], ['exists', ['l'], ['||', ['<=', ['VAR', 'k'], ['VAR', 'l']], ['>', ['VAR', 'k'], ['VAR', 'l']]]]]]
+    assert parse_bexp(" !( exists c b, c*c*b == n && c>1 && b>= 1 && c<pa) || pa * pa * (n / (pa * pa)) = n") == ['||', ['!', ['exists', ['c', 'b'], ['&&', ['&&', ['&&', ['=', ['*', ['*', ['VAR', 'c'], ['VAR', 'c']], ['VAR', 'b=']], ['VAR', 'n']], ['>', ['VAR', 'c'], ['INT', 1]]], ['>=', ['VAR', 'b'], ['INT', 1]]], ['<', ['VAR', 'c'], ['VAR', 'pa']]]]], ['=', ['*', ['*', ['VAR', 'pa'], ['VAR', 'pa']], ['/', ['VAR', 'n'], ['*', ['VAR', 'pa'], ['VAR', 'pa']]]], ['VAR', 'n']]]
+    assert parse_bexp("!x>2 && y<1") == ['&&', ['!', ['>', ['VAR', 'x'], ['INT', 2]]], ['<', ['VAR', 'y'], ['INT', 1]]]
+    assert parse_bexp("x>1") is not parse_bexp("x>1")
+
+
+def test_parse_simple_stmt():
+    assert parse_simple_stmt("x := x + 1") == ["assign", ["x"], [['+', ['VAR', 'x'], ['INT', 1]]]]
+    assert parse_simple_stmt("x, y := y, x") == ["assign", ["x", "y"], [['VAR', 'y'], ['VAR', 'x']]]
+    assert parse_simple_stmt("a[i+1] := t") == ["store", "ARR_a", ['+', ['VAR', 'i'], ['INT', 1]], ['VAR', 't']]
+    assert parse_simple_stmt("assert x <= y") == ["assert", ['<=', ['VAR', 'x'], ['VAR', 'y']]]
+
+
+def test_parse_stmts():
+    assert parse_stmts(" x := 1; ") == [["assign", ["x"], [['INT', 1]]]]
+    assert parse_stmts("while x < 2 do x := x + 1; end assert x = 2;") == [["while", ['<', ['VAR', 'x'], ['INT', 2]], [["assign", ["x"], [['+', ['VAR', 'x'], ['INT', 1]]]]]], ["assert", ['=', ['VAR', 'x'], ['INT', 2]]]]
+    assert parse_stmts("if x > y then x := y; else if x < y then y := x; end end") == [["ifelse", ['>', ['VAR', 'x'], ['VAR', 'y']], [["assign", ["x"], [['VAR', 'y']]]], [["if", ['<', ['VAR', 'x'], ['VAR', 'y']], [["assign", ["y"], [['VAR', 'x']]]]]]]]
+
+
+def test_format():
+    assert format_exp(parse_bexp("x>2 && !(y<4)")) == "((x > 2) && !((y < 4)))"
+    assert format_exp(parse_aexp("a[i+1]")) == "a[(i + 1)]"
+    assert format_stmt(parse_simple_stmt("x, y := y, x+1")) == "x, y := y, (x + 1)"
+    assert format_stmt(parse_stmts("while i < n do i := i + 1; end")[0]) == "while (i < n) do"
+
+
+def test_precedence():
+    x, y, z = ['VAR', 'x'], ['VAR', 'y'], ['VAR', 'z']
+    assert parse_aexp("x - y - z") == ['-', ['-', x, y], z]
+    assert parse_aexp("x + y * z") == ['+', x, ['*', y, z]]
+    assert parse_aexp("(x + y) * z") == ['*', ['+', x, y], z]
+    assert parse_bexp("x>0 ==> y>0 ==> z>0") == ['==>', ['==>', ['>', x, ['INT', 0]], ['>', y, ['INT', 0]]], ['>', z, ['INT', 0]]]
+    assert parse_bexp("x>0 || y>0 && z>0") == ['||', ['>', x, ['INT', 0]], ['&&', ['>', y, ['INT', 0]], ['>', z, ['INT', 0]]]]
+    assert parse_bexp("x>0 && forall i, i>0 || i<0")[2][0] == 'forall'
+
+
+def test_rejects_malformed():
+    for source in ("x && 3", "a<b<c", "x +", "(x", "3 == x", ""):
+        with pytest.raises(NotImplementedError):
+            parse_bexp(source)
+
+
+def test_large_conjunction():
+    n = 5000
+    exp = parse_bexp(" && ".join(f"a[i+{k}] <= x{k}" for k in range(n)))
+    for k in range(n - 1, 0, -1):
+        assert exp[0] == '&&' and exp[2] == ['<=', ['ARR', 'ARR_a', ['+', ['VAR', 'i'], ['INT', k]]], ['VAR', f"x{k}"]]
+        exp = exp[1]
+    assert exp == ['<=', ['ARR', 'ARR_a', ['+', ['VAR', 'i'], ['INT', 0]]], ['VAR', 'x0']]
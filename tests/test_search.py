@@ -0,0 +1,40 @@
+import os
+
+from see import verify
+from search import RandomPath
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_random_path_pops_every_state_once():
+	worklist = RandomPath(seed=1)
+	worklist.push([0])
+	seen = []
+	while worklist:
+		state = worklist.pop()
+		seen.append(state)
+		worklist.push([2 * state + 1, 2 * state + 2] if state < 60 else [])
+	assert sorted(seen) == list(range(121))
+
+
+def test_random_path_weights_subtrees_not_states():
+	# the first state forks into a shallow leaf and a subtree of 16 states: the leaf still gets half the picks
+	picks = 0
+	for seed in range(400):
+		worklist = RandomPath(seed=seed)
+		worklist.push(["leaf", "deep"])
+		if worklist.pop() == "leaf":
+			picks += 1
+			continue
+		worklist.push(list(range(16)))
+		picks += worklist.pop() == "leaf"
+	assert 0.65 < picks / 400 < 0.85
+
+
+def test_random_path_verdicts_match_dfs():
+	for name in ("min_valid.imp", "min_invalid.imp", "power_valid.imp"):
+		with open(os.path.join(HERE, name)) as f:
+			source = f.read()
+		random, dfs = verify(source, 6, strategy="random", seed=3), verify(source, 6)
+		assert random["stats"]["paths"] == dfs["stats"]["paths"]
+		assert sorted(v.split()[1] for v in random["violations"]) == sorted(v.split()[1] for v in dfs["violations"])
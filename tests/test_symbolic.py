@@ -0,0 +1,45 @@
+import os
+
+from see import verify
+from symbolic import mk
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def stores(arr):
+	n = 0
+	while arr.op == 'STORE':
+		arr, n = arr.args[0], n + 1
+	return n
+
+
+def test_store_chain_keeps_one_write_per_index():
+	a = mk('ARR', 'ARR_a')
+	x, y = mk('VAR', 'x'), mk('VAR', 'y')
+	written = mk('STORE', mk('STORE', mk('STORE', a, mk('INT', 1), x), mk('INT', 0), y), mk('INT', 1), y)
+	assert stores(written) == 2
+	assert written is mk('STORE', mk('STORE', a, mk('INT', 0), y), mk('INT', 1), y)
+	assert mk('SELECT', written, mk('INT', 0)) is y
+	assert mk('STORE', a, x, mk('SELECT', a, x)) is a
+
+
+def test_read_skips_distinct_offsets():
+	a, i, v = mk('ARR', 'ARR_a'), mk('VAR', 'i'), mk('VAR', 'v')
+	i1 = mk('+', i, mk('INT', 1))
+	written = mk('STORE', mk('STORE', a, i, v), i1, mk('INT', 7))
+	assert mk('SELECT', written, i) is v
+	assert mk('SELECT', written, mk('VAR', 'j')).args[0] is written
+
+
+def test_long_store_chain():
+	# writes to descending indices each sink to the bottom of the chain
+	a = mk('ARR', 'ARR_a')
+	for k in range(800, 0, -1):
+		a = mk('STORE', a, mk('INT', k), mk('VAR', 'x'))
+	assert stores(a) == 800
+	assert mk('SELECT', a, mk('INT', 5)) is mk('VAR', 'x')
+
+
+def test_long_store_chain_program():
+	with open(os.path.join(HERE, "deep_store_valid.imp")) as program:
+		assert verify(program.read(), 700)["violations"] == []